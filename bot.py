@@ -1,6 +1,7 @@
 """
 Telegram Bot Handlers and Logic with SQLite Storage
 """
+import asyncio
 import logging
 from typing import Dict, Any, Optional
 from telegram import Update
@@ -53,9 +54,6 @@ class Bot:
         """
         Setup all bot command and message handlers with persistent storage
         """
-        # 핸들러에 self를 전달하기 위해 partial 사용
-        from functools import partial
-
         # Resolve services from registry. This allows adding/removing
         # handler services without changing this class's signature.
         cmd_svc = self.get_service("command_handler_service")
@@ -138,14 +136,27 @@ def is_admin(user_id: int) -> bool:
     admin_ids = []  # Add admin user IDs here
     return user_id in admin_ids
 
-async def broadcast_message(context: ContextTypes.DEFAULT_TYPE, message: str, user_ids: list) -> None:
-    """Broadcast message to multiple users (admin function)"""
-    success_count = 0
-    for user_id in user_ids:
-        try:
-            await context.bot.send_message(chat_id=user_id, text=message)
-            success_count += 1
-        except TelegramError as e:
-            logger.error(f"Failed to send broadcast to user {user_id}: {str(e)}")
-    
+async def broadcast_message(
+    context: ContextTypes.DEFAULT_TYPE, message: str, user_ids: list, concurrency: int = 25
+) -> None:
+    """Broadcast message to multiple users (admin function)
+
+    Sends are issued concurrently over the bot's pooled HTTP connections,
+    with at most `concurrency` requests in flight; the application's rate
+    limiter paces them to Telegram's flood limits.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _send(user_id: int) -> bool:
+        async with semaphore:
+            try:
+                await context.bot.send_message(chat_id=user_id, text=message)
+                return True
+            except TelegramError as e:
+                logger.error(f"Failed to send broadcast to user {user_id}: {str(e)}")
+                return False
+
+    results = await asyncio.gather(*(_send(user_id) for user_id in user_ids))
+    success_count = sum(results)
+
     logger.info(f"Broadcast sent to {success_count}/{len(user_ids)} users")
\ No newline at end of file
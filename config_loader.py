@@ -1,13 +1,20 @@
 """
 Configuration loader for Telegram Gemini Bot
 """
+import copy
 import json
 import os
+from functools import lru_cache
 from typing import Dict, Any
 
+import orjson
+
 def load_config(config_path: str = "config.json") -> Dict[str, Any]:
     """
     Load configuration from JSON file with environment variable overrides
+
+    The parsed file is cached until its modification time changes; every
+    call still gets its own copy with the current environment applied.
     
     Args:
         config_path: Path to the configuration file
@@ -20,8 +27,8 @@ def load_config(config_path: str = "config.json") -> Dict[str, Any]:
         json.JSONDecodeError: If config file is invalid JSON
     """
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        mtime = os.path.getmtime(config_path)
+        config = copy.deepcopy(_load_config_file(config_path, mtime))
     except FileNotFoundError:
         raise FileNotFoundError(f"Configuration file not found: {config_path}")
     except json.JSONDecodeError as e:
@@ -36,6 +43,12 @@ def load_config(config_path: str = "config.json") -> Dict[str, Any]:
     
     return config
 
+@lru_cache(maxsize=4)
+def _load_config_file(config_path: str, mtime: float) -> Dict[str, Any]:
+    """Parse a config file; cached per (path, mtime) so edits are picked up"""
+    with open(config_path, 'rb') as f:
+        return orjson.loads(f.read())
+
 def _override_with_env_vars(config: Dict[str, Any]) -> Dict[str, Any]:
     """Override config values with environment variables"""
     
@@ -4,24 +4,50 @@ Google Gemini API Client for Telegram Bot with SQLite Storage
 
 from __future__ import annotations
 
+import asyncio
+import base64
+import hashlib
 import logging
-from typing import Optional, Dict, Any, List
+import os
+import tempfile
+import time
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
 from datetime import datetime
 import uuid
+import orjson
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
 from models import Message
 from message_storage import MessageStorage
+from internal.conversation_cache import ConversationCache, HistoryEntry, delete_keys_with_prefix
 from repositories import ChatRepository
 from services.chat_service import ChatService
 
 logger = logging.getLogger(__name__)
 
+# On-disk cache of genai.list_models(), reused across restarts
+DEFAULT_MODEL_CACHE_PATH = os.path.join("~", ".cache", "gemini_models.json")
+# Characters of the response returned with the finish reason
+RESPONSE_TAIL_CHARS = 1024
+# Redis key prefix of cached responses
+RESPONSE_CACHE_PREFIX = "gemcache:"
+
 
 class GeminiClient:
     """Client for interacting with Google Gemini API with persistent storage"""
 
+    _SAFETY_SETTINGS = {
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    }
+    # Tried in order when the configured model is not available
+    _FALLBACK_MODELS = ("gemini-pro", "gemini-1.5-pro", "gemini-1.0-pro", "gemini-pro-vision")
+    # (fetched_at, models) shared by every client in the process
+    _models_cache: Optional[Tuple[float, List[str]]] = None
+
     def __init__(
         self, config: Dict[str, Any], storage: Optional[MessageStorage] = None
     ):
@@ -39,14 +65,44 @@ class GeminiClient:
         self.max_tokens = config.get("max_tokens", 1000)
         self.top_p = config.get("top_p", 0.8)
         self.top_k = config.get("top_k", 40)
+        # Sent with every request, so parameter changes don't rebuild the model
+        self._generation_config = self._build_generation_config()
+        self._model_info = self._build_model_info()
 
         # Initialize storage and services
         self.storage = storage or MessageStorage()
         self.chat_repository = ChatRepository(self.storage)
-        self.chat_service = ChatService(self.chat_repository)
+        self.chat_service = ChatService(
+            self.chat_repository,
+            persona_cache_size=config.get("persona_cache_size", 10000),
+            persona_cache_ttl=config.get("persona_cache_ttl", 300),
+        )
 
-        # Configure API
-        genai.configure(api_key=self.api_key)
+        # Recent history per chat, shared across replicas when redis_url is set
+        self.redis = self._create_redis_client(config.get("redis_url"))
+        self.conversation_cache = ConversationCache(
+            redis_client=self.redis,
+            max_messages=config.get("context_cache_size", 40),
+            ttl=config.get("context_cache_ttl", 86400),
+            max_chats=config.get("context_cache_max_chats", 10000),
+        )
+        # Responses to identical (persona, history, message) turns are reused for
+        # this many seconds (0 disables); Redis when configured, else SQLite.
+        # Only at low temperatures, where resampling would give a similar answer
+        self.response_cache_ttl = config.get("response_cache_ttl", 0)
+        self.response_cache_max_temperature = config.get("response_cache_max_temperature", 0.3)
+        # Upper bound on estimated history tokens sent per turn (0 disables)
+        self.context_token_budget = config.get("context_token_budget", 8000)
+        # Model list is cached on disk for model_cache_ttl seconds (0 disables)
+        self.model_cache_path = os.path.expanduser(config.get("model_cache_path", DEFAULT_MODEL_CACHE_PATH))
+        self.model_cache_ttl = config.get("model_cache_ttl", 86400)
+        # Longest wait (seconds) for Gemini to start replying or send the next chunk
+        self.timeout_s = config.get("timeout_s", 60)
+
+        # Configure API. The SDK builds one client (and its keep-alive gRPC
+        # channel / HTTP session) per process on first use and reuses it for every
+        # request; "transport" picks grpc (default), grpc_asyncio or rest
+        genai.configure(api_key=self.api_key, transport=config.get("transport"))
 
         # Check available models and validate
         self._validate_model()
@@ -54,91 +110,134 @@ class GeminiClient:
         # Initialize model
         self.model = self._initialize_model()
 
+    @staticmethod
+    def _create_redis_client(redis_url: Optional[str]):
+        """Create an asyncio Redis client, or None when Redis is not configured"""
+        if not redis_url:
+            return None
+        try:
+            import redis.asyncio as redis
+
+            return redis.from_url(redis_url)
+        except Exception as e:
+            logger.error("Failed to create Redis client, using in-process cache: %s", e)
+            return None
+
     def _validate_model(self):
         """Validate and potentially fix model name"""
         try:
             # List available models
-            available_models = []
-            for model in genai.list_models():
-                if "generateContent" in model.supported_generation_methods:
-                    available_models.append(model.name.replace("models/", ""))
+            available_models = self._list_models()
 
-            logger.info(f"Available models: {available_models}")
+            logger.info("Available models: %s", available_models)
 
             # Check if current model is available
             if self.model_name not in available_models:
                 logger.warning(
-                    f"Model '{self.model_name}' not available. Available models: {available_models}"
+                    "Model '%s' not available. Available models: %s", self.model_name, available_models
                 )
 
                 # Try common model names in order of preference
-                fallback_models = [
-                    "gemini-pro",
-                    "gemini-1.5-pro",
-                    "gemini-1.0-pro",
-                    "gemini-pro-vision",
-                ]
-
-                for fallback in fallback_models:
+                for fallback in self._FALLBACK_MODELS:
                     if fallback in available_models:
-                        logger.info(f"Using fallback model: {fallback}")
+                        logger.info("Using fallback model: %s", fallback)
                         self.model_name = fallback
                         return
 
                 # If no fallback works, use first available model
                 if available_models:
                     self.model_name = available_models[0]
-                    logger.info(f"Using first available model: {self.model_name}")
+                    logger.info("Using first available model: %s", self.model_name)
                 else:
                     raise ValueError("No suitable models available")
             else:
-                logger.info(f"Using model: {self.model_name}")
+                logger.info("Using model: %s", self.model_name)
 
         except Exception as e:
-            logger.error(f"Error validating model: {str(e)}")
+            logger.error("Error validating model: %s", e)
             # Default to gemini-pro as last resort
             self.model_name = "gemini-pro"
-            logger.info(f"Falling back to default model: {self.model_name}")
+            logger.info("Falling back to default model: %s", self.model_name)
 
     def get_available_models(self) -> List[str]:
         """Get list of available models"""
         try:
-            models = []
-            for model in genai.list_models():
-                if "generateContent" in model.supported_generation_methods:
-                    models.append(model.name.replace("models/", ""))
-            return models
+            return self._list_models()
         except Exception as e:
-            logger.error(f"Error getting available models: {str(e)}")
+            logger.error("Error getting available models: %s", e)
             return []
 
-    def _initialize_model(self):
-        """Initialize the Gemini model with safety settings"""
-
-        generation_config = {
+    def _list_models(self) -> List[str]:
+        """List models supporting generateContent, served from the memory/disk cache when fresh"""
+        if self.model_cache_ttl > 0:
+            cached = GeminiClient._models_cache
+            if cached is not None and time.time() - cached[0] < self.model_cache_ttl:
+                return list(cached[1])
+            try:
+                mtime = os.path.getmtime(self.model_cache_path)
+                if time.time() - mtime < self.model_cache_ttl:
+                    with open(self.model_cache_path, "rb") as f:
+                        models = orjson.loads(f.read())
+                    GeminiClient._models_cache = (mtime, models)
+                    return list(models)
+            except (OSError, orjson.JSONDecodeError):
+                pass
+
+        models = [
+            model.name.replace("models/", "")
+            for model in genai.list_models()
+            if "generateContent" in model.supported_generation_methods
+        ]
+
+        if self.model_cache_ttl > 0 and models:
+            GeminiClient._models_cache = (time.time(), models)
+            try:
+                cache_dir = os.path.dirname(self.model_cache_path) or "."
+                os.makedirs(cache_dir, exist_ok=True)
+                # Write to a temp file and rename so readers never see a partial file
+                fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(orjson.dumps(models))
+                    os.replace(tmp_path, self.model_cache_path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            except OSError as e:
+                logger.warning("Failed to write model cache %s: %s", self.model_cache_path, e)
+        return models
+
+    def _build_generation_config(self) -> Dict[str, Any]:
+        """Build the generation config from the current model parameters"""
+        return {
             "temperature": self.temperature,
             "top_p": self.top_p,
             "top_k": self.top_k,
             "max_output_tokens": self.max_tokens,
         }
 
-        safety_settings = {
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    def _build_model_info(self) -> Dict[str, Any]:
+        """Build the static part of get_model_info from the current model parameters"""
+        return {
+            "model_name": self.model_name,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+            "top_k": self.top_k,
         }
 
+    def _initialize_model(self):
+        """Initialize the Gemini model with safety settings"""
         try:
             model = genai.GenerativeModel(
                 model_name=self.model_name,
-                generation_config=generation_config,
-                safety_settings=safety_settings,
+                generation_config=self._generation_config,
+                safety_settings=self._SAFETY_SETTINGS,
             )
-            logger.info(f"Gemini model '{self.model_name}' initialized successfully")
+            logger.info("Gemini model '%s' initialized successfully", self.model_name)
             return model
         except Exception as e:
-            logger.error(f"Failed to initialize Gemini model: {str(e)}")
+            logger.error("Failed to initialize Gemini model: %s", e)
             raise
 
     async def generate_response(
@@ -160,86 +259,304 @@ class GeminiClient:
             context_length: Number of previous messages to include in context
 
         Yields:
-            Generated response string chunks
+            Generated response string chunks, then a dict with the finish_reason
+            and the `tail` (last RESPONSE_TAIL_CHARS characters) of the response
         """
         logger.info(
-            f"Generating response for user {user_id} in chat {chat_id}. "
-            f"Context: {'On' if maintain_context else 'Off'} "
-            f"(length: {context_length if maintain_context else 0})"
+            "Generating response for user %s in chat %s. Context: %s (length: %d)",
+            user_id, chat_id, "On" if maintain_context else "Off", context_length if maintain_context else 0,
         )
 
-        interaction_id = uuid.uuid4().hex
+        # 128-bit random ID as 22-char URL-safe base64 (vs 32 hex chars) to keep
+        # the interaction_id columns and index narrow
+        interaction_id = base64.urlsafe_b64encode(uuid.uuid4().bytes).rstrip(b"=").decode("ascii")
+        # Messages of this turn, written together in one transaction at the end
+        pending_messages: List[Message] = []
 
         try:
-            # 1. Save user message first
+            # 1. Build history for ChatSession (before this turn is saved,
+            #    so the current message is not sent twice)
+            api_history = []
+            history: List[HistoryEntry] = []
+
+            if maintain_context:
+                # Persona and history are independent reads; run them concurrently
+                persona_prompt, history = await asyncio.gather(
+                    asyncio.to_thread(self.chat_service.get_persona, chat_id),
+                    self._load_history(chat_id, context_length * 2),
+                )
+                history = self._trim_history_to_budget(history)
+                api_history = [
+                    {'role': 'model' if role == 'assistant' else 'user', 'parts': [content]}
+                    for role, content in history
+                ]
+            else:
+                persona_prompt = await asyncio.to_thread(self.chat_service.get_persona, chat_id)
+
+            # 2. Queue user message (saved with the reply once streaming ends)
             user_message = Message(
                 chat_id=chat_id, user_id=user_id, role="user", content=message, timestamp=datetime.now()
             )
             setattr(user_message, 'interaction_id', interaction_id)
-            self.storage.save_message(user_message)
-
-            # 2. Build history for ChatSession
-            api_history = []
-            persona_prompt = self.chat_service.get_persona(chat_id)
+            pending_messages.append(user_message)
+            new_entries: List[HistoryEntry] = [("user", message)]
 
-            if maintain_context:
-                db_history = self.storage.get_conversation_history(
-                    chat_id=chat_id, limit=context_length * 2, include_system=True
-                )
-                for msg in db_history:
-                    api_history.append({
-                        'role': 'model' if msg.role == 'assistant' else 'user', 
-                        'parts': [msg.content]
-                    })
-            
-            # 3. Start chat session and prepare the message to send
-            chat_session = self.model.start_chat(history=api_history)
-            
+            # 3. Prepare the message to send
             # Inject persona into the first turn if it exists
             message_to_send = message
             if persona_prompt and not api_history:
                 message_to_send = f"{persona_prompt}\n\nUser: {message}"
                 logger.debug("Persona prompt injected into the first message.")
 
-            # 4. Generate response using streaming
-            response_stream = chat_session.send_message(message_to_send, stream=True)
+            # The reply depends only on persona, history and message, so it can be cached
+            response_cache_key = None
+            cached_response = None
+            if self.response_cache_ttl > 0 and self.temperature <= self.response_cache_max_temperature:
+                response_cache_key = self._response_cache_key(persona_prompt, history, message_to_send)
+                cached_response = await self._get_cached_response(response_cache_key)
 
             finish_reason = None
             full_response_text = ""
-            for chunk in response_stream:
-                if chunk.text:
-                    yield chunk.text
-                    full_response_text += chunk.text
-                finish_reason = chunk.candidates[0].finish_reason.name if chunk.candidates else None
-
-            # 5. Save the full response to the database at the end
+            usage_metadata = None
+            if cached_response is not None:
+                logger.info("Serving cached response for user %s in chat %s", user_id, chat_id)
+                finish_reason = "STOP"
+                full_response_text = cached_response
+                yield cached_response
+            else:
+                # 4. Generate response using streaming (async API, so the event
+                #    loop keeps serving other updates while Gemini responds)
+                if api_history:
+                    chat_session = self.model.start_chat(history=api_history)
+                    request = chat_session.send_message_async(
+                        message_to_send, generation_config=self._generation_config, stream=True
+                    )
+                else:
+                    # No history to track, so skip the ChatSession wrapper
+                    request = self.model.generate_content_async(
+                        message_to_send, generation_config=self._generation_config, stream=True
+                    )
+                # A stalled request or stream must not pin this turn forever
+                response_stream = await asyncio.wait_for(request, timeout=self.timeout_s)
+
+                # Collected as a list and joined once (O(n)); don't switch to
+                # `full_response_text += text`, which copies the text per chunk
+                parts: List[str] = []
+                last_chunk = None
+                chunks = response_stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout_s)
+                    except StopAsyncIteration:
+                        break
+                    text = chunk.text
+                    if text:
+                        yield text
+                        parts.append(text)
+                    last_chunk = chunk
+                full_response_text = "".join(parts)
+                # The finish reason is only meaningful on the final chunk
+                if last_chunk is not None:
+                    if last_chunk.candidates:
+                        finish_reason = last_chunk.candidates[0].finish_reason.name
+                    # Token counts for the whole exchange arrive with the last chunk
+                    usage_metadata = getattr(last_chunk, "usage_metadata", None)
+
+                # Only complete answers are cached; cut-off ones need continuation
+                if response_cache_key and finish_reason == "STOP" and full_response_text:
+                    await self._set_cached_response(response_cache_key, full_response_text)
+
+            # 5. Save the user message, the full response and token usage in one transaction
             response_text = full_response_text.strip()
             if response_text:
                 assistant_message = Message(
                     chat_id=chat_id, user_id=user_id, role="assistant", content=response_text,
                     timestamp=datetime.now(),
-                    metadata={"model": self.model_name, "temperature": self.temperature, "context_used": maintain_context}
+                    metadata={
+                        "model": self.model_name, "temperature": self.temperature, "context_used": maintain_context,
+                        "cached": cached_response is not None,
+                    }
                 )
                 setattr(assistant_message, 'interaction_id', interaction_id)
-                self.storage.save_message(assistant_message)
-                logger.info(f"Finished generating and saving full response for user {user_id} in chat {chat_id}")
+                pending_messages.append(assistant_message)
+                new_entries.append(("assistant", response_text))
             else:
-                logger.warning(f"Empty final response from Gemini for user {user_id} in chat {chat_id}")
-
-            # 6. Note about token counting
-            logger.warning("Token usage metadata is not available for streaming responses and was not recorded.")
+                logger.warning("Empty final response from Gemini for user %s in chat %s", user_id, chat_id)
+            await asyncio.to_thread(
+                self._save_turn, chat_id, user_id, interaction_id, pending_messages, usage_metadata
+            )
+            pending_messages = []
+            if response_text:
+                logger.info("Finished generating and saving full response for user %s in chat %s", user_id, chat_id)
+            await self.conversation_cache.append(chat_id, new_entries)
 
-            # 7. Yield finish reason at the end
-            yield {"finish_reason": finish_reason, "full_response_text": full_response_text}
+            # 6. Yield finish reason at the end; callers only need the end of the
+            #    text (e.g. to continue a cut-off reply), not another full copy
+            yield {"finish_reason": finish_reason, "tail": full_response_text[-RESPONSE_TAIL_CHARS:]}
 
         except StopIteration:
-            logger.warning(f"Caught StopIteration for user {user_id} in chat {chat_id}, likely an empty response from the model.")
+            logger.warning("Caught StopIteration for user %s in chat %s, likely an empty response from the model.", user_id, chat_id)
+            # The turn may be partially saved; let the next turn re-read the history
+            await self.conversation_cache.clear(chat_id)
             yield "모델로부터 응답이 없습니다. 다른 질문을 시도해 주세요."
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Gemini did not respond within %ss for user %s in chat %s", self.timeout_s, user_id, chat_id
+            )
+            await self.conversation_cache.clear(chat_id)
+            yield "⏱️ 응답 시간이 초과되었습니다. 잠시 후 다시 시도해 주세요."
         except Exception as e:
-            logger.exception(f"Error generating response for user {user_id} in chat {chat_id}: {str(e)}")
+            logger.exception("Error generating response for user %s in chat %s: %s", user_id, chat_id, e)
+            await self.conversation_cache.clear(chat_id)
             yield f"오류가 발생했습니다: {str(e)}"
+        finally:
+            # Keep the user's message even when the turn failed or was abandoned
+            if pending_messages:
+                try:
+                    await asyncio.to_thread(self.storage.save_messages, pending_messages[:1])
+                except Exception as e:
+                    logger.error("Failed to save user message for user %s in chat %s: %s", user_id, chat_id, e)
+
+    def _save_turn(
+        self, chat_id: int, user_id: int, interaction_id: str, messages: List[Message], usage_metadata
+    ) -> List[int]:
+        """
+        Store the turn's messages and their token counts in a single transaction
+
+        Args:
+            chat_id: Telegram chat ID
+            user_id: Telegram user ID
+            interaction_id: ID shared by the turn's messages
+            messages: The user message and, if any, the assistant message
+            usage_metadata: usage_metadata of the final stream chunk (None for cached replies, which cost none)
+
+        Returns:
+            IDs of the saved messages
+        """
+        with self.storage.transaction() as conn:
+            message_ids = self.storage.save_messages(messages, conn=conn)
+            if usage_metadata is not None:
+                counts = [
+                    ("user", getattr(usage_metadata, "prompt_token_count", 0)),
+                    ("assistant", getattr(usage_metadata, "candidates_token_count", 0)),
+                ]
+                rows = [
+                    (role, tokens, message_id)
+                    for (role, tokens), message_id in zip(counts, message_ids)
+                    if tokens
+                ]
+                self.storage.save_token_usage_batch(
+                    user_id, chat_id, rows, interaction_id=interaction_id, conn=conn
+                )
+        return message_ids
+
+    def _response_cache_key(
+        self, persona_prompt: Optional[str], history: List[HistoryEntry], message: str
+    ) -> str:
+        """Build the response cache key for a turn and the current model settings"""
+        digest = hashlib.sha256(
+            f"{self.model_name}|{sorted(self._generation_config.items())}|{persona_prompt or ''}".encode("utf-8")
+        )
+        for role, content in history:
+            digest.update(f"\x1e{role}\x1f{content}".encode("utf-8"))
+        digest.update(f"\x1e{message}".encode("utf-8"))
+        return f"{RESPONSE_CACHE_PREFIX}{digest.hexdigest()[:32]}"
+
+    async def _get_cached_response(self, key: str) -> Optional[str]:
+        """Look up a cached response; cache errors are treated as a miss"""
+        try:
+            if self.redis is None:
+                return await asyncio.to_thread(self.storage.get_cached_response, key, self.response_cache_ttl)
+            cached = await self.redis.get(key)
+        except Exception as e:
+            logger.warning("Response cache read failed: %s", e)
+            return None
+        return cached.decode("utf-8") if cached is not None else None
+
+    async def _set_cached_response(self, key: str, response_text: str) -> None:
+        """Store a response in the cache for response_cache_ttl seconds"""
+        try:
+            if self.redis is None:
+                await asyncio.to_thread(self.storage.save_cached_response, key, response_text, self.response_cache_ttl)
+            else:
+                await self.redis.setex(key, self.response_cache_ttl, response_text)
+        except Exception as e:
+            logger.warning("Response cache write failed: %s", e)
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Cheap token estimate: ~4 UTF-8 bytes per token (a 3-byte Korean syllable counts ~0.75)"""
+        return len(text.encode("utf-8")) // 4 + 1
+
+    def _trim_history_to_budget(self, history: List[HistoryEntry]) -> List[HistoryEntry]:
+        """
+        Drop the oldest messages until the estimated history size fits
+        context_token_budget.
+
+        Args:
+            history: List of (role, content) in chronological order
+
+        Returns:
+            The most recent messages that fit, starting with a user message
+        """
+        if self.context_token_budget <= 0:
+            return history
+
+        total = 0
+        start = len(history)
+        while start > 0:
+            total += self._estimate_tokens(history[start - 1][1])
+            if total > self.context_token_budget:
+                break
+            start -= 1
+        # Gemini expects the history to open with a user turn
+        while start < len(history) and history[start][0] != "user":
+            start += 1
+        if start:
+            logger.debug("Trimmed %s oldest messages to fit the context token budget", start)
+        return history[start:]
+
+    async def _load_history(self, chat_id: int, limit: int) -> List[HistoryEntry]:
+        """
+        Get the most recent messages of a chat, served from the conversation
+        cache when possible.
+
+        Args:
+            chat_id: Telegram chat ID
+            limit: Maximum number of messages
+
+        Returns:
+            List of (role, content) in chronological order
+        """
+        cache = self.conversation_cache
+        if limit > cache.max_messages:
+            return await asyncio.to_thread(self.storage.get_context_rows, chat_id, limit)
+
+        history = await cache.get(chat_id, limit)
+        if history is not None:
+            return history
+
+        entries = await asyncio.to_thread(self.storage.get_context_rows, chat_id, cache.max_messages)
+        await cache.seed(chat_id, entries)
+        return entries[-limit:]
 
-    def clear_conversation(self, chat_id: int, user_id: int) -> int:
+    async def reset_caches(self) -> None:
+        """
+        Drop every cache built from the database. Call after the tables are
+        reset, so the next turn does not send deleted history to Gemini.
+        """
+        await self.conversation_cache.clear_all()
+        self.chat_service.clear_persona_cache()
+        # Cached responses are keyed by history that no longer exists. The SQLite
+        # response_cache table is dropped by reset_database; Redis keys are not
+        if self.redis is not None:
+            try:
+                await delete_keys_with_prefix(self.redis, RESPONSE_CACHE_PREFIX)
+            except Exception as e:
+                logger.warning("Response cache flush failed: %s", e)
+        logger.info("Conversation, persona and response caches cleared.")
+
+    async def clear_conversation(self, chat_id: int, user_id: int) -> int:
         """
         Clear conversation history (marks messages as deleted or removes them)
 
@@ -249,19 +566,23 @@ class GeminiClient:
 
         Returns:
             Number of messages cleared
+
+        Raises:
+            Exception: storage errors are logged and re-raised so callers can report them
         """
-        logger.info(f"Clearing conversation for user {user_id} in chat {chat_id}.")
+        logger.info("Clearing conversation for user %s in chat %s.", user_id, chat_id)
         try:
-            cleared_count = self.storage.clear_conversation(chat_id=chat_id, user_id=user_id)
+            cleared_count = await asyncio.to_thread(self.storage.clear_conversation, chat_id, user_id)
+            await self.conversation_cache.clear(chat_id)
             logger.info(
-                f"Successfully cleared {cleared_count} messages for user {user_id} in chat {chat_id}."
+                "Successfully cleared %s messages for user %s in chat %s.", cleared_count, user_id, chat_id
             )
             return cleared_count
         except Exception as e:
-            logger.error(f"Error clearing conversation: {str(e)}")
-            return 0
+            logger.error("Error clearing conversation: %s", e)
+            raise
 
-    def get_conversation_length(
+    async def get_conversation_length(
         self, chat_id: int, user_id: Optional[int] = None
     ) -> int:
         """
@@ -275,15 +596,12 @@ class GeminiClient:
             Number of messages in conversation
         """
         try:
-            history = self.storage.get_conversation_history(
-                chat_id, user_id, limit=1000
-            )
-            return len(history)
+            return await asyncio.to_thread(self.storage.count_messages, chat_id, user_id)
         except Exception as e:
-            logger.error(f"Error getting conversation length: {str(e)}")
+            logger.error("Error getting conversation length: %s", e)
             return 0
 
-    def get_chat_statistics(self, chat_id: int) -> Dict[str, Any]:
+    async def get_chat_statistics(self, chat_id: int) -> Dict[str, Any]:
         """
         Get comprehensive chat statistics
 
@@ -294,12 +612,12 @@ class GeminiClient:
             Dictionary with chat statistics
         """
         try:
-            return self.storage.get_chat_stats(chat_id)
+            return await asyncio.to_thread(self.storage.get_chat_stats, chat_id)
         except Exception as e:
-            logger.error(f"Error getting chat statistics: {str(e)}")
+            logger.error("Error getting chat statistics: %s", e)
             return {}
 
-    def get_user_statistics(self, user_id: int) -> Dict[str, Any]:
+    async def get_user_statistics(self, user_id: int) -> Dict[str, Any]:
         """
         Get comprehensive user statistics
 
@@ -310,22 +628,22 @@ class GeminiClient:
             Dictionary with user statistics
         """
         try:
-            return self.storage.get_user_stats(user_id)
+            return await asyncio.to_thread(self.storage.get_user_stats, user_id)
         except Exception as e:
-            logger.error(f"Error getting user statistics: {str(e)}")
+            logger.error("Error getting user statistics: %s", e)
             return {}
 
-    def get_user_token_statistics(self, user_id: int) -> Dict[str, Any]:
+    async def get_user_token_statistics(self, user_id: int) -> Dict[str, Any]:
         """사용자별 토큰 통계 반환 (storage passthrough)"""
         try:
-            return self.storage.get_user_token_stats(user_id)
+            return await asyncio.to_thread(self.storage.get_user_token_stats, user_id)
         except Exception as e:
-            logger.error(f"Error getting user token stats: {str(e)}")
+            logger.error("Error getting user token stats: %s", e)
             return {}
 
-    def search_messages(
+    async def search_messages(
         self, query: str, chat_id: Optional[int] = None, user_id: Optional[int] = None
-    ) -> List[Dict[str, Any]]:
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
         Search messages by content
 
@@ -334,25 +652,23 @@ class GeminiClient:
             chat_id: Limit search to specific chat
             user_id: Limit search to specific user
 
-        Returns:
-            List of matching messages
+        Yields:
+            Matching messages, newest first; each dict is built only when consumed
         """
         try:
-            messages = self.storage.search_messages(query, chat_id, user_id)
-            return [
-                {
-                    "chat_id": msg.chat_id,
-                    "user_id": msg.user_id,
-                    "role": msg.role,
-                    "content": msg.content,
-                    "timestamp": msg.timestamp.isoformat(),
-                    "metadata": msg.metadata,
-                }
-                for msg in messages
-            ]
+            messages = await asyncio.to_thread(self.storage.search_messages, query, chat_id, user_id)
         except Exception as e:
-            logger.error(f"Error searching messages: {str(e)}")
-            return []
+            logger.error("Error searching messages: %s", e)
+            return
+        for msg in messages:
+            yield {
+                "chat_id": msg.chat_id,
+                "user_id": msg.user_id,
+                "role": msg.role,
+                "content": msg.content,
+                "timestamp": msg.timestamp.isoformat(),
+                "metadata": msg.metadata,
+            }
 
     def set_model_parameters(
         self,
@@ -361,11 +677,6 @@ class GeminiClient:
         top_p: Optional[float] = None,
         top_k: Optional[int] = None,
     ) -> None:
-        logger.info(
-            f"Updating model parameters: temp={temperature}, "
-            f"max_tokens={max_tokens}, top_p={top_p}, top_k={top_k}"
-        )
-
         """
         Update model parameters
 
@@ -375,20 +686,25 @@ class GeminiClient:
             top_p: Nucleus sampling parameter
             top_k: Top-k sampling parameter
         """
-        if temperature is not None:
-            self.temperature = temperature
-        if max_tokens is not None:
-            self.max_tokens = max_tokens
-        if top_p is not None:
-            self.top_p = top_p
-        if top_k is not None:
-            self.top_k = top_k
-
-        # Reinitialize model with new parameters
-        self.model = self._initialize_model()
+        requested = {"temperature": temperature, "max_tokens": max_tokens, "top_p": top_p, "top_k": top_k}
+        changed = {
+            name: value for name, value in requested.items()
+            if value is not None and getattr(self, name) != value
+        }
+        if not changed:
+            logger.debug("Model parameters unchanged; nothing to update")
+            return
+
+        logger.info("Updating model parameters: %s", changed)
+        for name, value in changed.items():
+            setattr(self, name, value)
+
+        # Applied per request; the model object itself is reused
+        self._generation_config = self._build_generation_config()
+        self._model_info = self._build_model_info()
         logger.info("Model parameters updated")
 
-    def get_model_info(self) -> Dict[str, Any]:
+    async def get_model_info(self) -> Dict[str, Any]:
         """
         Get current model information including storage stats
 
@@ -396,17 +712,12 @@ class GeminiClient:
             Dictionary with model configuration and storage statistics
         """
         logger.info("Fetching model information and storage stats.")
-        model_info = {
-            "model_name": self.model_name,
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens,
-            "top_p": self.top_p,
-            "top_k": self.top_k,
-        }
+        # Model parameters only change in set_model_parameters; storage stats are live
+        model_info = dict(self._model_info)
 
         # Add storage statistics
         try:
-            storage_stats = self.storage.get_database_stats()
+            storage_stats = await asyncio.to_thread(self.storage.get_database_stats)
             model_info.update(
                 {
                     "storage_stats": storage_stats,
@@ -416,12 +727,12 @@ class GeminiClient:
                 }
             )
         except Exception as e:
-            logger.error(f"Error getting storage stats: {str(e)}")
+            logger.error("Error getting storage stats: %s", e)
             model_info["storage_error"] = str(e)
 
         return model_info
 
-    def export_conversation(self, chat_id: int, format: str = "json") -> str:
+    async def export_conversation(self, chat_id: int, format: str = "json") -> str:
         """
         Export conversation history
 
@@ -433,12 +744,12 @@ class GeminiClient:
             Exported conversation data
         """
         try:
-            return self.storage.export_chat_history(chat_id, format)
+            return await asyncio.to_thread(self.storage.export_chat_history, chat_id, format)
         except Exception as e:
-            logger.error(f"Error exporting conversation: {str(e)}")
+            logger.error("Error exporting conversation: %s", e)
             return f"Export failed: {str(e)}"
 
-    def cleanup_old_data(self, days_to_keep: int = 30) -> Dict[str, int]:
+    async def cleanup_old_data(self, days_to_keep: int = 30) -> Dict[str, int]:
         """
         Clean up old conversation data
 
@@ -449,10 +760,13 @@ class GeminiClient:
             Cleanup statistics
         """
         try:
-            deleted_messages = self.storage.cleanup_old_messages(days_to_keep)
+            deleted_messages, chat_ids = await asyncio.to_thread(self.storage.prune_old_messages, days_to_keep)
+            # Pruned messages must not stay in the cached context of those chats
+            for chat_id in chat_ids:
+                await self.conversation_cache.clear(chat_id)
             return {"deleted_messages": deleted_messages, "days_kept": days_to_keep}
         except Exception as e:
-            logger.error(f"Error during cleanup: {str(e)}")
+            logger.error("Error during cleanup: %s", e)
             return {"error": str(e)}
 
     def close(self):
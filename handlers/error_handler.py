@@ -1,16 +1,17 @@
 import logging
-from telegram import Update
 from telegram.ext import ContextTypes
 
 logger = logging.getLogger(__name__)
 
+_ERROR_REPLY = "❌ 시스템 오류가 발생했습니다. 관리자에게 문의해주세요."
+
 class ErrorHandler:
     async def handle(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
-        logger.error(f"Exception while handling an update: {context.error}")
-        if isinstance(update, Update) and update.effective_message:
+        logger.error("Exception while handling an update: %s", context.error)
+        # update may be None or a non-Update object (e.g. for job errors)
+        message = getattr(update, "effective_message", None)
+        if message:
             try:
-                await update.effective_message.reply_text(
-                    "❌ 시스템 오류가 발생했습니다. 관리자에게 문의해주세요."
-                )
+                await message.reply_text(_ERROR_REPLY)
             except Exception:
                 logger.error("Could not send error message to user")
@@ -1,12 +1,192 @@
+import asyncio
 import logging
-from telegram import Update
+from typing import Iterator, List, Optional, Set
+from weakref import WeakValueDictionary
+from telegram import Message, Update
+from telegram.error import BadRequest, RetryAfter, TelegramError
 from telegram.ext import ContextTypes
 
 logger = logging.getLogger(__name__)
 
+# Longest user message accepted
+MAX_INPUT_LENGTH = 4000
+# Size of each reply message, a bit less than Telegram's 4096 for safety
+TELEGRAM_MESSAGE_LIMIT = 4000
+# Minimum seconds between in-place edits of a streaming reply
+# (Telegram allows roughly one message per second per chat)
+STREAM_EDIT_INTERVAL = 1.0
+# Follow-up requests allowed when a reply is cut off at max_tokens (prevents endless loops)
+MAX_CONTINUATIONS = 3
+# A MAX_TOKENS reply shorter than this is not continued (nothing meaningful to extend)
+MIN_CONTINUATION_CHARS = 50
+# Telegram shows the typing indicator for about 5 seconds; refresh it a bit sooner
+TYPING_REFRESH_INTERVAL = 4.0
+
+# Fixed replies
+_TOO_LONG_TEMPLATE = "❌ 메시지가 너무 깁니다. 최대 {max_length}자까지 입력 가능합니다."
+_CONTINUATION_NOTICE = "...답변이 길어 이어서 생성합니다..."
+# 마지막 500자를 컨텍스트로 사용하여 더 자연스러운 연속 생성 유도
+_CONTINUATION_PROMPT = (
+    "이전 답변이 중간에 끊겼습니다. 다음 내용에 이어서 계속 작성해주세요.\n\n"
+    "이전 내용 마지막 부분: \"...{tail}\""
+)
+_MAX_CONTINUATIONS_NOTICE = "⚠️ 답변이 너무 길어 여러 번에 걸쳐 전송했지만, 여전히 답변이 완료되지 않았을 수 있습니다."
+_ERROR_REPLY = "❌ 죄송합니다. 메시지 처리 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요."
+_BUSY_REPLY = "⏳ 이전 메시지에 대한 답변을 아직 작성 중입니다. 답변이 끝난 뒤 다시 보내주세요."
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-flight
+_background_tasks: Set[asyncio.Task] = set()
+
+
+async def _send_typing(bot, chat_id: int) -> None:
+    """Send the typing indicator; it is advisory, so failures are only logged."""
+    try:
+        await bot.send_chat_action(chat_id=chat_id, action="typing")
+    except TelegramError as e:
+        logger.debug("Failed to send typing action to chat %s: %s", chat_id, e)
+
+
+async def _typing_heartbeat(bot, chat_id: int, interval: float = TYPING_REFRESH_INTERVAL) -> None:
+    """Keep the typing indicator visible until cancelled."""
+    while True:
+        await _send_typing(bot, chat_id)
+        await asyncio.sleep(interval)
+
+
+def _iter_chunks(text: str, limit: int) -> Iterator[str]:
+    """Lazily split text into Telegram-sized pieces.
+
+    Each piece is at most `limit` characters and ends at the last newline
+    within the limit when there is one; whitespace after a split point is
+    dropped. The last piece is whatever remains (possibly empty).
+    """
+    start = 0
+    length = len(text)
+    while length - start > limit:
+        split_pos = text.rfind('\n', start, start + limit)
+        # If no newline found, force split at the limit (less ideal but necessary)
+        if split_pos == -1:
+            split_pos = start + limit
+        yield text[start:split_pos]
+        start = split_pos
+        while start < length and text[start].isspace():
+            start += 1
+    yield text[start:]
+
+
+class _StreamingReply:
+    """Deliver a streamed reply to a Telegram message.
+
+    The first text is sent as a new reply and later text is applied to it
+    with edit_text at most once per `edit_interval` seconds. Once the text
+    outgrows `limit`, the full pieces are finalized and the stream continues
+    in a new message. With `edit_interval=None` nothing is shown until a
+    piece is full or the stream finishes. Consecutive sends are spaced at
+    least `send_interval` seconds apart so splitting a long reply does not
+    burst past Telegram's per-chat limit.
+
+    Intermediate edits run in the background so the stream keeps being read
+    while Telegram answers; text that arrives meanwhile is merged into the
+    next edit instead of queueing another request.
+    """
+
+    def __init__(self, message: Message, limit: int, edit_interval: Optional[float],
+                 send_interval: float = 0.0):
+        self._message = message
+        self._limit = limit
+        self._edit_interval = edit_interval
+        self._send_interval = send_interval
+        self._sent: Optional[Message] = None  # Reply currently being edited
+        self._sent_text = ""
+        # Text of the current reply, may be ahead of _sent_text. Kept as pieces
+        # and only joined when it is sent or split, so appends stay O(1)
+        self._parts: List[str] = []
+        self._length = 0
+        self._last_flush = 0.0
+        self._inflight: Optional[asyncio.Task] = None  # Intermediate edit being sent
+
+    def _text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    async def _settle(self) -> None:
+        """Wait for the intermediate edit in flight, if any."""
+        if self._inflight is not None:
+            inflight, self._inflight = self._inflight, None
+            await inflight
+
+    async def add(self, text: str) -> None:
+        self._parts.append(text)
+        self._length += len(text)
+        if self._length > self._limit:
+            await self._settle()
+            pieces = _iter_chunks(self._text(), self._limit)
+            current = next(pieces)
+            for piece in pieces:
+                await self._flush(current, final=True)
+                self._sent, self._sent_text = None, ""
+                current = piece
+            self._parts = [current]
+            self._length = len(current)
+
+        if self._edit_interval is not None and (self._inflight is None or self._inflight.done()):
+            now = asyncio.get_running_loop().time()
+            if now - self._last_flush >= self._edit_interval:
+                await self._settle()  # Surfaces errors of the previous edit
+                self._inflight = asyncio.create_task(self._flush(self._text(), final=False))
+
+    async def finish(self) -> None:
+        await self._settle()
+        await self._flush(self._text(), final=True)
+
+    async def _flush(self, text: str, final: bool) -> None:
+        if not text.strip() or text == self._sent_text:
+            return
+        wait = self._last_flush + self._send_interval - asyncio.get_running_loop().time()
+        if wait > 0:
+            if not final:
+                return
+            await asyncio.sleep(wait)
+        try:
+            if self._sent is None:
+                self._sent = await self._message.reply_text(text)
+            else:
+                await self._sent.edit_text(text)
+        except RetryAfter as e:
+            if not final:
+                # Intermediate edits are optional; the next one catches up
+                logger.debug("Streaming edit throttled for %ss", e.retry_after)
+                return
+            await asyncio.sleep(e.retry_after)
+            return await self._flush(text, final)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+        self._sent_text = text
+        self._last_flush = asyncio.get_running_loop().time()
+
 class MessageHandlerService:
-    def __init__(self, gemini_client):
+    def __init__(self, gemini_client, max_input_length: int = MAX_INPUT_LENGTH,
+                 message_limit: int = TELEGRAM_MESSAGE_LIMIT, streaming: bool = True,
+                 edit_interval: float = STREAM_EDIT_INTERVAL, max_continuations: int = MAX_CONTINUATIONS):
         self.gemini_client = gemini_client
+        self.max_input_length = max_input_length
+        self._too_long_reply = _TOO_LONG_TEMPLATE.format(max_length=max_input_length)
+        self.message_limit = message_limit
+        # Show the reply while it is generated by editing it in place
+        self.streaming = streaming
+        self.edit_interval = edit_interval
+        self.max_continuations = max_continuations
+        # One lock per user while they have a turn running; unused locks drop out
+        self._user_locks: "WeakValueDictionary[int, asyncio.Lock]" = WeakValueDictionary()
+
+    def _user_lock(self, user_id: int) -> asyncio.Lock:
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._user_locks[user_id] = lock
+        return lock
 
     async def handle(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         user = update.effective_user
@@ -14,34 +194,45 @@ class MessageHandlerService:
         if not message:
             logger.error("Update message has no text")
             return
-        max_length = 4000
-        if len(message) > max_length:
-            await update.message.reply_text(
-                f"❌ 메시지가 너무 깁니다. 최대 {max_length}자까지 입력 가능합니다."
-            )
+        if len(message) > self.max_input_length:
+            await update.message.reply_text(self._too_long_reply)
+            return
+
+        # Updates run concurrently; a user's messages are still answered one at a time
+        # so their turns don't interleave in the history or in the chat. A message that
+        # arrives mid-answer is turned away instead of waiting: a waiter would hold one
+        # of PTB's concurrent_updates slots, and a burst could starve other users
+        lock = self._user_lock(user.id)
+        if lock.locked():
+            await update.message.reply_text(_BUSY_REPLY)
             return
+        async with lock:
+            await self._respond(update, context, message)
 
+    async def _respond(self, update: Update, context: ContextTypes.DEFAULT_TYPE, message: str) -> None:
+        user = update.effective_user
         # Check if a new conversation should be started
-        start_new_conversation = context.user_data.get('new_conversation', False)
-        if start_new_conversation:
-            maintain_context = False
-            context.user_data['new_conversation'] = False  # Reset the flag
-            logger.info(f"Handling message for user {user.id} with new conversation context.")
-        else:
-            maintain_context = True
+        # The flag only applies to the next message, so take it out
+        maintain_context = not context.user_data.pop('new_conversation', False)
+        if not maintain_context:
+            logger.info("Handling message for user %s with new conversation context.", user.id)
 
+        # Show the typing indicator for the whole turn, continuations included
+        typing_task = asyncio.create_task(_typing_heartbeat(context.bot, update.effective_chat.id))
+        _background_tasks.add(typing_task)
+        typing_task.add_done_callback(_background_tasks.discard)
         try:
             current_message = message
             continuation_count = 0
-            max_continuations = 3  # 무한 루프 방지를 위한 최대 연속 실행 횟수
+            max_continuations = self.max_continuations
 
             while continuation_count <= max_continuations:
-                await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-                
                 finish_reason = None
-                response_buffer = ""
-                full_response_text_from_gemini = ""
-                telegram_message_limit = 4000  # A bit less than 4096 for safety
+                response_tail = ""
+                reply = _StreamingReply(
+                    update.message, self.message_limit, self.edit_interval if self.streaming else None,
+                    send_interval=self.edit_interval or 0.0,
+                )
 
                 # Use async for to stream and buffer the response chunks
                 async for chunk in self.gemini_client.generate_response(
@@ -53,53 +244,37 @@ class MessageHandlerService:
                     # Handle the finish_reason dictionary yielded at the end of the stream
                     if isinstance(chunk, dict) and 'finish_reason' in chunk:
                         finish_reason = chunk['finish_reason']
-                        full_response_text_from_gemini = chunk.get('full_response_text', '')
+                        response_tail = chunk.get('tail', '')
                         continue
 
                     if chunk:
-                        response_buffer += chunk
-                        # When buffer exceeds the limit, find a good split point and send
-                        while len(response_buffer) > telegram_message_limit:
-                            # Find the last newline to split gracefully
-                            split_pos = response_buffer.rfind('\n', 0, telegram_message_limit)
-                            
-                            # If no newline found, force split at the limit (less ideal but necessary)
-                            if split_pos == -1:
-                                split_pos = telegram_message_limit
-                            
-                            message_to_send = response_buffer[:split_pos]
-                            response_buffer = response_buffer[split_pos:].lstrip()
-
-                            if message_to_send.strip():
-                                await update.message.reply_text(message_to_send)
-
-                # Send any remaining text in the buffer after the loop finishes
-                if response_buffer.strip():
-                    await update.message.reply_text(response_buffer)
+                        await reply.add(chunk)
+
+                # Show the complete text of the last message
+                await reply.finish()
                 
                 # Check finish reason to decide whether to continue
+                if finish_reason == 'MAX_TOKENS' and len(response_tail) < MIN_CONTINUATION_CHARS:
+                    logger.warning("Response for user %s hit MAX_TOKENS with almost no text; not continuing.", user.id)
+                    break
                 if finish_reason == 'MAX_TOKENS':
                     continuation_count += 1
                     if continuation_count <= max_continuations:
-                        logger.warning(f"Response for user {user.id} was cut off due to MAX_TOKENS. Continuing... ({continuation_count}/{max_continuations})")
-                        await update.message.reply_text("...답변이 길어 이어서 생성합니다...")
-                        # 마지막 500자를 컨텍스트로 사용하여 더 자연스러운 연속 생성 유도
-                        context_for_continuation = full_response_text_from_gemini[-500:]
-                        current_message = (
-                            f"이전 답변이 중간에 끊겼습니다. 다음 내용에 이어서 계속 작성해주세요.\n\n"
-                            f"이전 내용 마지막 부분: \"...{context_for_continuation}\""
-                        )
+                        logger.warning("Response for user %s was cut off due to MAX_TOKENS. Continuing... (%s/%s)", user.id, continuation_count, max_continuations)
+                        await update.message.reply_text(_CONTINUATION_NOTICE)
+                        current_message = _CONTINUATION_PROMPT.format(tail=response_tail[-500:])
                         maintain_context = True # 컨텍스트는 계속 유지
                     else:
-                        logger.warning(f"Max continuations reached for user {user.id}.")
-                        await update.message.reply_text("⚠️ 답변이 너무 길어 여러 번에 걸쳐 전송했지만, 여전히 답변이 완료되지 않았을 수 있습니다.")
+                        logger.warning("Max continuations reached for user %s.", user.id)
+                        await update.message.reply_text(_MAX_CONTINUATIONS_NOTICE)
                         break # 루프 종료
                 else:
                     # 응답이 잘리지 않았으면 루프 종료
                     break
 
-            logger.info(f"Message handled for user {user.id}")
+            logger.info("Message handled for user %s", user.id)
         except Exception as e:
-            logger.error(f"Error handling message from user {user.id}: {str(e)}")
-            error_message = "❌ 죄송합니다. 메시지 처리 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요."
-            await update.message.reply_text(error_message)
+            logger.error("Error handling message from user %s: %s", user.id, e)
+            await update.message.reply_text(_ERROR_REPLY)
+        finally:
+            typing_task.cancel()
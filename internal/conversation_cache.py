@@ -0,0 +1,170 @@
+"""Conversation context cache.
+
+Keeps the most recent messages of each chat so GeminiClient can build the
+history for the next turn without querying the messages table. When a Redis
+client is given, the history lives in a Redis list per chat (shared by every
+bot replica and kept across restarts); otherwise an in-process store is used.
+
+The messages table remains the source of truth: a cache miss (or any Redis
+error) makes the caller fall back to the database and re-seed the cache.
+"""
+import logging
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Deque, List, Optional, Sequence, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# (role, content) pair, in chronological order
+HistoryEntry = Tuple[str, str]
+
+# Keys per SCAN page and per DEL call when flushing a key prefix
+_FLUSH_BATCH_SIZE = 500
+
+
+async def delete_keys_with_prefix(redis_client, prefix: str) -> None:
+    """Delete every Redis key starting with prefix, in batches (SCAN, never KEYS)."""
+    keys = [key async for key in redis_client.scan_iter(match=f"{prefix}*", count=_FLUSH_BATCH_SIZE)]
+    for i in range(0, len(keys), _FLUSH_BATCH_SIZE):
+        await redis_client.delete(*keys[i:i + _FLUSH_BATCH_SIZE])
+
+
+class ConversationCache:
+    """Per-chat cache of the most recent conversation messages."""
+
+    def __init__(self, redis_client=None, max_messages: int = 40, ttl: int = 86400, key_prefix: str = "conv:",
+                 max_chats: int = 10000):
+        """
+        Args:
+            redis_client: redis.asyncio.Redis instance (None uses the in-process store)
+            max_messages: Number of most recent messages kept per chat
+            ttl: Expiry of a chat's history in Redis, in seconds
+            key_prefix: Redis key prefix
+            max_chats: Number of chats kept by the in-process store (least recently used are evicted)
+        """
+        self.redis = redis_client
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.max_chats = max_chats
+        # In-process store: fixed-size ring buffer per chat (O(1) append/evict),
+        # ordered from least to most recently used
+        self._local: "OrderedDict[int, Deque[HistoryEntry]]" = OrderedDict()
+
+    def _key(self, chat_id: int) -> str:
+        return f"{self.key_prefix}{chat_id}"
+
+    @staticmethod
+    def _encode(entry: HistoryEntry) -> bytes:
+        role, content = entry
+        return orjson.dumps({"role": role, "content": content})
+
+    @staticmethod
+    def _decode(raw) -> HistoryEntry:
+        data = orjson.loads(raw)
+        return data["role"], data["content"]
+
+    async def get(self, chat_id: int, limit: int) -> Optional[List[HistoryEntry]]:
+        """
+        Return up to `limit` most recent messages of a chat.
+
+        Returns:
+            List of (role, content) in chronological order, or None on a cache miss
+        """
+        if limit <= 0:
+            # LRANGE key -0 -1 would return the whole list
+            return []
+        if limit > self.max_messages:
+            return None
+
+        if self.redis is None:
+            entries = self._local.get(chat_id)
+            if not entries:
+                return None
+            self._local.move_to_end(chat_id)
+            return list(islice(entries, max(0, len(entries) - limit), None))
+
+        try:
+            raw = await self.redis.lrange(self._key(chat_id), -limit, -1)
+        except Exception as e:
+            logger.warning("Conversation cache read failed for chat %s: %s", chat_id, e)
+            return None
+        if not raw:
+            return None
+        return [self._decode(item) for item in raw]
+
+    async def seed(self, chat_id: int, entries: Sequence[HistoryEntry]) -> None:
+        """Replace the cached history of a chat with entries loaded from the database."""
+        entries = list(entries)[-self.max_messages:]
+        if not entries:
+            return
+
+        if self.redis is None:
+            self._local[chat_id] = deque(entries, maxlen=self.max_messages)
+            self._local.move_to_end(chat_id)
+            while len(self._local) > self.max_chats:
+                evicted, _ = self._local.popitem(last=False)
+                logger.debug("Conversation cache evicted idle chat %s", evicted)
+            return
+
+        key = self._key(chat_id)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.rpush(key, *(self._encode(e) for e in entries))
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Conversation cache seed failed for chat %s: %s", chat_id, e)
+
+    async def append(self, chat_id: int, entries: Sequence[HistoryEntry]) -> None:
+        """
+        Append new messages to a chat's cached history.
+
+        Chats that are not cached are left alone (RPUSHX), so the next read
+        misses and re-seeds the full history from the database instead of
+        caching a truncated one.
+        """
+        if not entries:
+            return
+
+        if self.redis is None:
+            cached = self._local.get(chat_id)
+            if cached is not None:
+                cached.extend(entries)
+                self._local.move_to_end(chat_id)
+            return
+
+        key = self._key(chat_id)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.rpushx(key, *(self._encode(e) for e in entries))
+                pipe.ltrim(key, -self.max_messages, -1)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Conversation cache append failed for chat %s: %s", chat_id, e)
+
+    async def clear_all(self) -> None:
+        """Drop the cached history of every chat (e.g. after the messages table is reset)."""
+        if self.redis is None:
+            self._local.clear()
+            return
+
+        try:
+            await delete_keys_with_prefix(self.redis, self.key_prefix)
+        except Exception as e:
+            logger.warning("Conversation cache flush failed: %s", e)
+
+    async def clear(self, chat_id: int) -> None:
+        """Drop a chat's cached history."""
+        if self.redis is None:
+            self._local.pop(chat_id, None)
+            return
+
+        try:
+            await self.redis.delete(self._key(chat_id))
+        except Exception as e:
+            logger.warning("Conversation cache clear failed for chat %s: %s", chat_id, e)
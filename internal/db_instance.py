@@ -1,10 +1,8 @@
 from internal.database import create_backend
-import json
+import orjson
 
-cfg = None
-with open("configs/db.json", "r") as f:
-    cfg = json.load(f)
-    f.close()
+with open("configs/db.json", "rb") as f:
+    cfg = orjson.loads(f.read())
 
 backend = create_backend(cfg)
 engine = backend["engine"]
@@ -23,7 +23,8 @@ def get_engine(db_path: Optional[str] = None, memory: bool = False, echo: bool =
         url = f"sqlite:///{path}"
         engine = create_engine(
             url,
-            connect_args={"check_same_thread": False},
+            # Larger per-connection prepared statement cache (default 128)
+            connect_args={"check_same_thread": False, "cached_statements": 256},
             poolclass=QueuePool,
             pool_size=5,
             max_overflow=10,
@@ -35,6 +36,13 @@ def get_engine(db_path: Optional[str] = None, memory: bool = False, echo: bool =
         try:
             cursor = dbapi_connection.cursor()
             cursor.execute("PRAGMA journal_mode=WAL;")
+            # In WAL mode NORMAL only syncs at checkpoints; commits stay durable
+            # against application crashes
+            cursor.execute("PRAGMA synchronous=NORMAL;")
+            cursor.execute("PRAGMA temp_store=MEMORY;")
+            cursor.execute("PRAGMA mmap_size=268435456;")
+            # 64 MiB page cache per pooled connection (negative = KiB)
+            cursor.execute("PRAGMA cache_size=-64000;")
             cursor.execute("PRAGMA foreign_keys=ON;")
             cursor.close()
         except Exception:
@@ -1,14 +1,18 @@
 """
 Utility functions for application setup extracted from main.py.
 """
-from telegram.ext import Application
+from telegram.ext import AIORateLimiter, Application
 
 
-def setup_telegram_app(config):
+def setup_telegram_app(config, message_storage=None, gemini_client=None):
     """Setup Telegram application with handlers.
 
     Args:
         config (dict): Loaded configuration dictionary.
+        message_storage (MessageStorage, optional): Shared storage instance;
+            a new one is created when omitted.
+        gemini_client (GeminiClient, optional): Shared client; a new one is
+            created on message_storage when omitted.
 
     Returns:
         telegram.ext.Application: Configured Telegram Application instance.
@@ -16,24 +20,45 @@ def setup_telegram_app(config):
     if not config:
         raise ValueError("Configuration not loaded")
 
-    app = Application.builder().token(config["telegram"]["bot_token"]).build()
+    telegram_config = config["telegram"]
+    # Keep-alive pool shared by all outgoing Bot API calls (replies, broadcasts)
+    app = (
+        Application.builder()
+        .token(telegram_config["bot_token"])
+        .connection_pool_size(telegram_config.get("connection_pool_size", 100))
+        .pool_timeout(telegram_config.get("pool_timeout", 10.0))
+        # HTTP/2 multiplexes concurrent calls over one TLS connection
+        .http_version(telegram_config.get("http_version", "2"))
+        # Token buckets for Telegram's flood limits (30 msg/s overall,
+        # 20 msg/min per group) so bursts are delayed instead of hitting 429s
+        .rate_limiter(AIORateLimiter(max_retries=telegram_config.get("rate_limit_max_retries", 1)))
+        # Handle updates from different users in parallel (MessageHandlerService
+        # answers one message per user at a time and turns away messages sent
+        # mid-answer, so one user cannot hold several slots). Bounded to roughly the
+        # SQLite pool size (5 + 10 overflow) so handlers don't queue on connections
+        .concurrent_updates(telegram_config.get("concurrent_updates", 16))
+        .build()
+    )
 
     # Local imports to avoid import-time side-effects
     from gemini_client import GeminiClient
     from message_storage import MessageStorage
     from services.message_service import MessageService
-    from services.chat_service import ChatService
-    from repositories.chat_repository import ChatRepository
     from handlers.command_handler_service import CommandHandlerService
     from handlers.message_handler_service import MessageHandlerService
     from handlers.error_handler import ErrorHandler
 
-    message_storage = MessageStorage()
-    gemini_client = GeminiClient(config.get('gemini', {}), message_storage)
+    if message_storage is None:
+        message_storage = MessageStorage()
+    if gemini_client is None:
+        gemini_client = GeminiClient(config.get('gemini', {}), message_storage)
     message_service = MessageService(message_storage)
-    chat_repository = ChatRepository(message_storage)
-    chat_service = ChatService(chat_repository)
-    command_handler_service = CommandHandlerService(message_storage=message_storage, chat_service=chat_service)
+    # Share GeminiClient's ChatService so persona updates refresh its persona cache
+    command_handler_service = CommandHandlerService(
+        message_storage=message_storage,
+        chat_service=gemini_client.chat_service,
+        gemini_client=gemini_client,
+    )
     message_handler_service = MessageHandlerService(gemini_client)
     error_handler_service = ErrorHandler()
 
@@ -1,9 +1,29 @@
 import os
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Background listener that does the actual formatting and I/O
+_listener: Optional[QueueListener] = None
+
+
+def _stop_listener() -> None:
+    """Flush queued records and stop the background listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def setup_logging(config: dict):
-    """Set up logging to file and console."""
+    """Set up logging to file and console.
+
+    Loggers only enqueue records; a QueueListener thread formats them and
+    writes to the console and log file, keeping I/O off the event loop.
+    """
+    global _listener
     log_level_str = config.get("app", {}).get("log_level", "INFO").upper()
     log_level = getattr(logging, log_level_str, logging.INFO)
 
@@ -18,6 +38,10 @@ def setup_logging(config: dict):
     # Remove existing handlers to avoid duplication
     if root_logger.hasHandlers():
         root_logger.handlers.clear()
+    if _listener is None:
+        atexit.register(_stop_listener)
+    else:
+        _stop_listener()
 
     # Create formatter
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -25,9 +49,12 @@ def setup_logging(config: dict):
     # Console handler
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(formatter)
-    root_logger.addHandler(stream_handler)
 
     # File handler
     file_handler = logging.FileHandler("logs/app.log", encoding='utf-8')
     file_handler.setFormatter(formatter)
-    root_logger.addHandler(file_handler)
+
+    log_queue = queue.Queue(-1)
+    root_logger.addHandler(QueueHandler(log_queue))
+    _listener = QueueListener(log_queue, stream_handler, file_handler, respect_handler_level=True)
+    _listener.start()
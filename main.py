@@ -1,13 +1,16 @@
 """
 Telegram Bot with Gemini AI - Main FastAPI Application
 """
-import json
 import os
+import html
+import asyncio
 import logging
+from collections import Counter, deque
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse
+import orjson
 from fastapi.templating import Jinja2Templates
 from telegram.ext import Application
 import uvicorn
@@ -22,10 +25,51 @@ logger = logging.getLogger(__name__)
 # Global variables
 telegram_app = None
 config = None
-message_history = []  # Store recent messages for monitoring
+MESSAGE_HISTORY_SIZE = 100
+message_history = deque(maxlen=MESSAGE_HISTORY_SIZE)  # Store recent messages for monitoring
+# Per-user view of message_history, kept in step with it so /health and /stats don't rescan
+user_message_counts: Counter = Counter()
+user_meta = {}  # user_id -> {"name", "username"} of the user's latest message
+
+
+def _record_message(message_info: dict) -> None:
+    """Append to message_history, evicting the oldest entry and updating the per-user counts."""
+    if len(message_history) == MESSAGE_HISTORY_SIZE:
+        evicted_id = message_history.popleft()["user_id"]
+        user_message_counts[evicted_id] -= 1
+        if user_message_counts[evicted_id] <= 0:
+            del user_message_counts[evicted_id]
+            user_meta.pop(evicted_id, None)
+    message_history.append(message_info)
+    user_id = message_info["user_id"]
+    user_message_counts[user_id] += 1
+    user_meta[user_id] = {"name": message_info["first_name"], "username": message_info["username"]}
+
+
+def _save_user_and_chat(storage, user_info, chat_info) -> None:
+    """Persist the sender and chat of a webhook update (runs in a worker thread)."""
+    storage.save_user(user_info)
+    storage.save_chat(chat_info)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response whose final serialization step uses orjson.
+
+    Routes have no response_model, so FastAPI still runs jsonable_encoder
+    first; only the encoding itself is faster. OPT_NON_STR_KEYS keeps
+    JSONResponse's behaviour of turning int keys (e.g. user_id) into strings.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
 
 # Setup templates
-templates = Jinja2Templates(directory="templates")
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+# 템플릿은 import 시 한 번만 컴파일; 요청마다 로더 조회(파일 mtime 확인)를 하지 않음
+_LOGIN_TEMPLATE = templates.get_template("login.html")
+_MESSAGES_TEMPLATE = templates.get_template("messages.html")
+_DASHBOARD_TEMPLATE = templates.get_template("dashboard.html")
+_DASHBOARD_ERROR_HTML = "<html><body><h1>오류</h1><p>Dashboard 로딩 중 오류: {error}</p></body></html>"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -35,7 +79,18 @@ async def lifespan(app: FastAPI):
     # Startup
     config = load_config()
     setup_logging(config)  # Setup logging
-    telegram_app = setup_telegram_app(config)
+    from message_storage import MessageStorage
+    from services.message_service import MessageService
+    from repositories import MessageRepository
+    from gemini_client import GeminiClient
+
+    # One storage for the bot handlers and every route; MessageStorage() re-runs
+    # the schema setup, so it must not be constructed per request
+    app.state.storage = MessageStorage()
+    app.state.message_service = MessageService(MessageRepository(app.state.storage))
+    # Shared with the bot handlers so admin routes can reset its caches
+    app.state.gemini_client = GeminiClient(config.get("gemini", {}), app.state.storage)
+    telegram_app = setup_telegram_app(config, app.state.storage, app.state.gemini_client)
     
     # Initialize bot
     await telegram_app.initialize()
@@ -61,7 +116,8 @@ app = FastAPI(
     title="Telegram Gemini Bot",
     description="A Telegram bot powered by Google Gemini AI",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 @app.get("/login", response_class=HTMLResponse)
@@ -78,17 +134,16 @@ async def telegram_login_page(request: Request):
         raise HTTPException(status_code=500, detail="Telegram bot username is not configured")
 
     context = {
-        "request": request,
         "bot_username": bot_username,
         "request_access": telegram_settings.get("login_request_access", "write"),
         "button_size": telegram_settings.get("login_button_size", "large"),
         "button_radius": telegram_settings.get("login_button_radius", 10),
         "show_userpic": telegram_settings.get("login_show_userpic", True),
     }
-    return templates.TemplateResponse("login.html", context)
+    return HTMLResponse(_LOGIN_TEMPLATE.render(context))
 
 @app.post("/auth/telegram")
-async def authenticate_telegram_user(payload: TelegramAuthPayload):
+async def authenticate_telegram_user(payload: TelegramAuthPayload, request: Request):
     """
     Verify Telegram login payload and persist user info.
     """
@@ -103,13 +158,9 @@ async def authenticate_telegram_user(payload: TelegramAuthPayload):
         raise HTTPException(status_code=403, detail="Invalid auth data")
 
     # Persist basic user info for future use
-    from message_storage import MessageStorage
     from models import UserInfo
 
-    message_storage = globals().get("message_storage")
-    if not message_storage:
-        message_storage = MessageStorage()
-        globals()["message_storage"] = message_storage
+    message_storage = request.app.state.storage
 
     user_info = UserInfo(
         user_id=payload.id,
@@ -117,15 +168,16 @@ async def authenticate_telegram_user(payload: TelegramAuthPayload):
         first_name=payload.first_name,
         last_name=payload.last_name,
     )
-    message_storage.save_user(user_info)
+    # SQLite 호출은 이벤트 루프를 막지 않도록 스레드에서 실행
+    await asyncio.to_thread(message_storage.save_user, user_info)
 
     response_payload = payload.to_user_payload()
-    db_stats = message_storage.get_database_stats()
+    db_stats = await asyncio.to_thread(message_storage.get_database_stats)
     recent_activity = [
         {"date": row["date"], "message_count": row["message_count"]}
         for row in db_stats.get("recent_activity", []) or []
     ]
-    user_chats = message_storage.get_user_chat_list(user_info.user_id, limit=20)
+    user_chats = await asyncio.to_thread(message_storage.get_user_chat_list, user_info.user_id, limit=20)
 
     database_status = {
         "users": db_stats.get("users_count", 0),
@@ -137,7 +189,7 @@ async def authenticate_telegram_user(payload: TelegramAuthPayload):
         "recent_activity": recent_activity
     }
 
-    return JSONResponse({
+    return ORJSONResponse({
         "success": True,
         "user": response_payload,
         "database": database_status,
@@ -154,15 +206,14 @@ async def webhook(request: Request):
     """Handle incoming Telegram webhooks"""
     try:
         # Get the update from Telegram
-        update_data = await request.json()
+        update_data = orjson.loads(await request.body())
         from telegram import Update
         update = Update.de_json(update_data, telegram_app.bot)
         
         # Store message for monitoring (keep last 100 messages)
         if update.message:
-            from message_storage import MessageStorage
             from models import UserInfo, ChatInfo
-            storage = MessageStorage()
+            storage = request.app.state.storage
 
             message_info = {
                 "timestamp": update.message.date.isoformat(),
@@ -172,9 +223,7 @@ async def webhook(request: Request):
                 "message": update.message.text or "[Non-text message]",
                 "chat_id": update.message.chat_id
             }
-            message_history.append(message_info)
-            if len(message_history) > 100:
-                message_history.pop(0)
+            _record_message(message_info)
 
             # --- 사용자 및 채팅 정보 자동 저장 ---
             user = update.message.from_user
@@ -189,12 +238,15 @@ async def webhook(request: Request):
             chat_info = ChatInfo(
                 chat_id=chat.id, chat_type=chat.type, title=chat.title, username=chat.username
             )
-            storage.save_user(user_info)
-            storage.save_chat(chat_info)
+            await asyncio.to_thread(_save_user_and_chat, storage, user_info, chat_info)
             logger.debug(f"Saved user {user.id} and chat {chat.id} info to DB.")
         
-        # Process the update
-        await telegram_app.process_update(update)
+        # Hand the update to the application's queue and ack right away; its
+        # update fetcher (started in lifespan) runs the handlers concurrently
+        # (bounded by concurrent_updates) and routes errors to the error handler.
+        # Awaiting the handlers here would hold Telegram's request for the whole
+        # Gemini reply and trigger webhook retries.
+        await telegram_app.update_queue.put(update)
         
         return {"status": "ok"}
     
@@ -210,53 +262,37 @@ async def health_check():
         "bot_running": telegram_app is not None,
         "config_loaded": config is not None,
         "total_messages": len(message_history),
-        "active_users": len(set(msg["user_id"] for msg in message_history))
+        "active_users": len(user_message_counts)
     }
 
 @app.get("/messages", response_class=HTMLResponse)
 async def view_messages(request: Request):
     """View recent messages in a web interface"""
-    # DB에서 최근 메시지 조회
-    from message_storage import MessageStorage
-    message_storage = globals().get('message_storage')
-    if not message_storage:
-        message_storage = MessageStorage()
-    # 최근 20개 메시지 (모든 채팅, 모든 사용자)
-    recent_messages = []
-    import sqlite3
-    with message_storage._get_connection() as conn:
-        cursor = conn.execute("SELECT * FROM messages ORDER BY timestamp DESC LIMIT 20")
-        rows = cursor.fetchall()
-        for row in rows:
-            recent_messages.append({
-                "user_id": row["user_id"],
-                "username": "-",
-                "first_name": "-",
-                "timestamp": row["timestamp"],
-                "message": row["content"]
-            })
+    # DB에서 최근 메시지 조회: 최근 20개 메시지 (모든 채팅, 모든 사용자)
+    rows = await asyncio.to_thread(request.app.state.storage.get_recent_messages, 20)
+    recent_messages = [
+        {
+            "user_id": row["user_id"],
+            "username": "-",
+            "first_name": "-",
+            "timestamp": row["timestamp"],
+            "message": row["content"]
+        }
+        for row in rows
+    ]
 
     context = {
-        "request": request,
         "recent_messages": recent_messages,
         "total_messages": len(recent_messages),
         "active_users": len(set(msg["user_id"] for msg in recent_messages))
     }
-    return templates.TemplateResponse("messages.html", context)
+    return HTMLResponse(_MESSAGES_TEMPLATE.render(context))
 
 @app.get("/messages/json")
-async def get_messages_json():
+async def get_messages_json(request: Request):
     """Get recent messages as JSON"""
-    from services.message_service import MessageService
-    message_service = globals().get('message_service')
-    if not message_service:
-        # message_storage가 이미 전역에 있다면 활용
-        message_storage = globals().get('message_storage')
-        if not message_storage:
-            from message_storage import MessageStorage
-            message_storage = MessageStorage()
-        message_service = MessageService(message_storage)
-    recent_messages = message_service.get_all_messages(limit=20)
+    message_service = request.app.state.message_service
+    recent_messages = await asyncio.to_thread(message_service.get_all_messages, limit=20)
     return {
         "total_messages": len(recent_messages),
         "active_users": len(set(msg["user_id"] for msg in recent_messages)),
@@ -331,15 +367,13 @@ async def webhook_dashboard(request: Request):
         webhook_status = "✅ 활성" if webhook_info.url else "❌ 비활성"
         
         # DB에서 통계 및 최근 메시지 가져오기
-        from message_storage import MessageStorage
-        storage = MessageStorage()
-        db_stats = storage.get_database_stats()
+        storage = request.app.state.storage
+        db_stats = await asyncio.to_thread(storage.get_database_stats)
         
         # search_messages는 최신순으로 반환합니다.
-        recent_messages_from_db = storage.search_messages(query="%", limit=20)
+        recent_messages_from_db = await asyncio.to_thread(storage.search_messages, query="%", limit=20)
 
         context = {
-            "request": request,
             "webhook_info": webhook_info,
             "webhook_status": webhook_status,
             "db_stats": db_stats,
@@ -347,19 +381,19 @@ async def webhook_dashboard(request: Request):
             # 메모리 기반 활성 사용자 대신 DB 기반 총 사용자 수 사용
             "active_users": db_stats.get("unique_user_chat_count", 0) 
         }
-        return templates.TemplateResponse("dashboard.html", context)
+        return HTMLResponse(_DASHBOARD_TEMPLATE.render(context))
     except Exception as e:
-        return HTMLResponse(content=f"<html><body><h1>오류</h1><p>Dashboard 로딩 중 오류: {str(e)}</p></body></html>")
+        return HTMLResponse(content=_DASHBOARD_ERROR_HTML.format(error=html.escape(str(e))))
 
 @app.post("/admin/reset-db")
-async def reset_database():
+async def reset_database(request: Request):
     """
     데이터베이스를 초기화합니다. (주의: 모든 데이터 삭제)
     """
     try:
-        from message_storage import MessageStorage
-        storage = MessageStorage()
-        storage.reset_database()
+        await asyncio.to_thread(request.app.state.storage.reset_database)
+        # 캐시된 대화 기록이 삭제된 메시지를 다시 Gemini에 보내지 않도록 함께 비움
+        await request.app.state.gemini_client.reset_caches()
         return {"status": "ok", "message": "데이터베이스가 성공적으로 초기화되었습니다."}
     except Exception as e:
         logger.error(f"Error resetting database: {str(e)}")
@@ -368,25 +402,14 @@ async def reset_database():
 @app.get("/stats")
 async def get_stats():
     """Get bot statistics"""
-    if not message_history:
-        return {"total_messages": 0, "active_users": 0, "user_stats": []}
-    
-    # Count messages per user
-    user_stats = {}
-    for msg in message_history:
-        user_id = msg["user_id"]
-        if user_id not in user_stats:
-            user_stats[user_id] = {
-                "name": msg["first_name"],
-                "username": msg["username"],
-                "message_count": 0
-            }
-        user_stats[user_id]["message_count"] += 1
-    
+    user_stats = [
+        {**user_meta[user_id], "message_count": count}
+        for user_id, count in user_message_counts.items()
+    ]
     return {
         "total_messages": len(message_history),
         "active_users": len(user_stats),
-        "user_stats": list(user_stats.values())
+        "user_stats": user_stats
     }
 
 if __name__ == "__main__":
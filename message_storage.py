@@ -4,19 +4,55 @@ SQLite 기반 메시지 히스토리 저장소
 """
 import sqlite3
 import re
-import json
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Set, Tuple
 from dataclasses import dataclass
 import threading
 from contextlib import contextmanager
+import orjson
+from sqlalchemy import text
 from internal.db_instance import engine as _engine, SessionLocal as _SessionLocal, get_connection as _get_connection
 
 from models import Message, ChatInfo, UserInfo
 
 logger = logging.getLogger(__name__)
 
+# 매 턴 실행되는 쿼리는 모듈 로드 시 한 번만 구성 (SQLAlchemy 컴파일 캐시 키도 재사용)
+_INSERT_MESSAGE_SQL = text("""
+    INSERT INTO messages (chat_id, user_id, role, content, timestamp, metadata, interaction_id)
+    VALUES (:chat_id, :user_id, :role, :content, :timestamp, :metadata, :interaction_id)
+""")
+_INSERT_TOKEN_USAGE_SQL = text("""
+    INSERT INTO token_usage (user_id, chat_id, message_id, interaction_id, role, tokens, timestamp)
+    VALUES (:user_id, :chat_id, :message_id, :interaction_id, :role, :tokens, :ts)
+""")
+_GET_PERSONA_SQL = text("SELECT persona_prompt FROM chats WHERE chat_id = :chat_id")
+_CONTEXT_ROWS_SQL = text("""
+    SELECT role, content FROM messages
+    WHERE chat_id = :chat_id
+    ORDER BY timestamp DESC LIMIT :limit
+""")
+_RECENT_MESSAGES_SQL = text("SELECT * FROM messages ORDER BY timestamp DESC LIMIT :limit")
+
+
+def _history_sql(by_user: bool, include_system: bool):
+    sql = "SELECT * FROM messages WHERE chat_id = :chat_id"
+    if by_user:
+        sql += " AND user_id = :user_id"
+    if not include_system:
+        sql += " AND role = 'user'"
+    return text(sql + " ORDER BY timestamp DESC LIMIT :limit")
+
+
+# (user_id 필터 여부, include_system) 조합별 대화 기록 쿼리
+_HISTORY_SQL = {
+    (by_user, include_system): _history_sql(by_user, include_system)
+    for by_user in (False, True)
+    for include_system in (False, True)
+}
+
 class MessageStorage:
     def clear_conversation(self, chat_id: int, user_id: int) -> int:
         """
@@ -26,7 +62,6 @@ class MessageStorage:
         
         Returns: 삭제된 메시지 개수
         """
-        from sqlalchemy import text
         with self._lock:
             with self._get_connection() as conn:
                 with conn.begin():
@@ -83,7 +118,6 @@ class MessageStorage:
 
     def _init_database(self):
         """데이터베이스 및 테이블 초기화"""
-        from sqlalchemy import text
         with self._get_connection() as conn:
             # run schema creation inside a single transaction
             with conn.begin():
@@ -143,13 +177,29 @@ class MessageStorage:
                     )
                 """))
 
+                # 응답 캐시 테이블 (동일한 프롬프트/컨텍스트에 대한 Gemini 응답)
+                conn.execute(text("""
+                    CREATE TABLE IF NOT EXISTS response_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        response TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """))
+
                 # 인덱스 생성 (성능 향상)
                 conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_chat_timestamp ON messages (chat_id, timestamp DESC)"))
                 conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_user_timestamp ON messages (user_id, timestamp DESC)"))
                 conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_interaction_id ON messages (interaction_id)"))
-                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_chat_user ON messages (chat_id, user_id)"))
+                # (chat_id, user_id) lookups use the prefix; the timestamp column lets
+                # per-user history walk the index instead of sorting
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_chat_user_timestamp ON messages (chat_id, user_id, timestamp DESC)"))
+                conn.execute(text("DROP INDEX IF EXISTS idx_messages_chat_user"))
                 conn.execute(text("CREATE INDEX IF NOT EXISTS idx_token_usage_user_ts ON token_usage (user_id, timestamp DESC)"))
                 conn.execute(text("CREATE INDEX IF NOT EXISTS idx_token_usage_chat_user ON token_usage (chat_id, user_id)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_response_cache_created_at ON response_cache (created_at)"))
+
+            # 전문 검색 인덱스 (SQLite FTS5)
+            self._fts_enabled = self._init_fts(conn)
 
             # 스키마 마이그레이션: interaction_id 컬럼 추가
             self._add_column_if_not_exists(conn, 'messages', 'interaction_id', 'TEXT')
@@ -158,6 +208,50 @@ class MessageStorage:
 
         logger.info(f"Database initialized: {self.db_path}")
     
+    def _init_fts(self, conn) -> bool:
+        """
+        messages.content를 미러링하는 FTS5 trigram 인덱스와 동기화 트리거를 생성합니다.
+        trigram 토크나이저는 LIKE '%...%'와 같은 부분 문자열 검색을 지원하므로
+        조사가 붙는 한국어에서도 기존 검색 결과와 동일하게 동작합니다.
+
+        Returns:
+            FTS 사용 가능 여부 (SQLite가 아니거나 FTS5가 없으면 False)
+        """
+        if self._engine.dialect.name != "sqlite":
+            return False
+        try:
+            with conn.begin():
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+                )).fetchone()
+                conn.execute(text("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts
+                    USING fts5(content, content='messages', content_rowid='id', tokenize='trigram')
+                """))
+                conn.execute(text("""
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+                        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+                    END
+                """))
+                conn.execute(text("""
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+                        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                    END
+                """))
+                conn.execute(text("""
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+                        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+                    END
+                """))
+                if not exists:
+                    # 기존 메시지 1회 색인
+                    conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+            return True
+        except Exception as e:
+            logger.warning(f"FTS5 unavailable, search falls back to LIKE: {str(e)}")
+            return False
+
     @contextmanager
     def _get_connection(self):
         """Compatibility wrapper around the centralized DBSession.get_connection.
@@ -167,12 +261,27 @@ class MessageStorage:
         # _get_connection from db_instance expects the engine as first arg
         with _get_connection(self._engine) as conn:
             yield conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        여러 쓰기를 하나의 트랜잭션으로 묶음 (커밋/fsync 1회)
+
+        블록이 예외 없이 끝나면 커밋, 예외가 나면 롤백됩니다. 블록 안에서는
+        save_messages / save_token_usage에 conn을 넘겨 같은 트랜잭션을 사용합니다.
+
+        Yields:
+            트랜잭션이 열린 connection
+        """
+        with self._lock:
+            with self._get_connection() as conn:
+                with conn.begin():
+                    yield conn
     
     def save_user(self, user_info: UserInfo) -> None:
         """사용자 정보 저장/업데이트"""
         with self._lock:
             with self._get_connection() as conn:
-                from sqlalchemy import text
                 with conn.begin():
                     conn.execute(text("""
                         INSERT OR REPLACE INTO users (user_id, username, first_name, last_name)
@@ -184,7 +293,6 @@ class MessageStorage:
         logger.debug(f"[SAVE_CHAT] Saving chat info for chat_id {chat_info.chat_id}: {chat_info}")
         with self._lock:
             with self._get_connection() as conn:
-                from sqlalchemy import text
                 # Use INSERT OR IGNORE + UPDATE to prevent overwriting existing fields with None
                 with conn.begin():
                     # 1. Try to insert a new record, but ignore if chat_id already exists.
@@ -218,7 +326,6 @@ class MessageStorage:
         """채팅 페르소나 업데이트"""
         with self._lock:
             with self._get_connection() as conn:
-                from sqlalchemy import text
                 with conn.begin():
                     conn.execute(text("""
                         UPDATE chats 
@@ -230,8 +337,7 @@ class MessageStorage:
         """채팅 페르소나 조회"""
         logger.debug(f"[GET_CHAT_PERSONA] Getting persona for chat_id {chat_id}")
         with self._get_connection() as conn:
-            from sqlalchemy import text
-            result = conn.execute(text("SELECT persona_prompt FROM chats WHERE chat_id = :chat_id"), {"chat_id": chat_id})
+            result = conn.execute(_GET_PERSONA_SQL, {"chat_id": chat_id})
             row = result.fetchone()
             logger.debug(f"[GET_CHAT_PERSONA] Fetched row for chat_id {chat_id}: {row}")
             return row[0] if row else None
@@ -246,30 +352,43 @@ class MessageStorage:
         Returns:
             메시지 ID
         """
-        with self._lock:
-            with self._get_connection() as conn:
-                from sqlalchemy import text
-                metadata_json = json.dumps(message.metadata) if message.metadata else None
-                # interaction_id를 Message 객체에서 가져오거나 None으로 설정
-                interaction_id = getattr(message, 'interaction_id', None)
-                with conn.begin():
-                    cursor = conn.execute(text("""
-                        INSERT INTO messages (chat_id, user_id, role, content, timestamp, metadata, interaction_id)
-                        VALUES (:chat_id, :user_id, :role, :content, :timestamp, :metadata, :interaction_id)
-                    """), {
-                        "chat_id": message.chat_id,
-                        "user_id": message.user_id,
-                        "role": message.role,
-                        "content": message.content,
-                        "timestamp": message.timestamp or datetime.now(),
-                        "metadata": metadata_json,
-                        "interaction_id": interaction_id,
-                    })
-                    try:
-                        lastrowid = cursor.lastrowid or 0
-                    except Exception:
-                        lastrowid = (cursor.inserted_primary_key[0] if hasattr(cursor, 'inserted_primary_key') and cursor.inserted_primary_key else 0)
-                return int(lastrowid)
+        return self.save_messages([message])[0]
+
+    def save_messages(self, messages: List[Message], conn=None) -> List[int]:
+        """
+        여러 메시지를 하나의 트랜잭션으로 저장 (커밋/fsync 1회)
+
+        Args:
+            messages: 저장할 메시지 목록 (저장 순서대로)
+            conn: transaction()으로 연 connection (없으면 새 트랜잭션에서 저장)
+
+        Returns:
+            메시지 ID 목록
+        """
+        if conn is None:
+            with self.transaction() as conn:
+                return self.save_messages(messages, conn)
+
+        message_ids = []
+        for message in messages:
+            metadata_json = orjson.dumps(message.metadata).decode() if message.metadata else None
+            # interaction_id를 Message 객체에서 가져오거나 None으로 설정
+            interaction_id = getattr(message, 'interaction_id', None)
+            cursor = conn.execute(_INSERT_MESSAGE_SQL, {
+                "chat_id": message.chat_id,
+                "user_id": message.user_id,
+                "role": message.role,
+                "content": message.content,
+                "timestamp": message.timestamp or datetime.now(),
+                "metadata": metadata_json,
+                "interaction_id": interaction_id,
+            })
+            try:
+                lastrowid = cursor.lastrowid or 0
+            except Exception:
+                lastrowid = (cursor.inserted_primary_key[0] if hasattr(cursor, 'inserted_primary_key') and cursor.inserted_primary_key else 0)
+            message_ids.append(int(lastrowid))
+        return message_ids
     
     def get_conversation_history(
         self, 
@@ -290,26 +409,17 @@ class MessageStorage:
         Returns:
             메시지 목록 (시간순 정렬)
         """
-        from sqlalchemy import text
         with self._get_connection() as conn:
-            sql = "SELECT * FROM messages WHERE chat_id = :chat_id"
             params = {"chat_id": chat_id, "limit": limit}
-
             if user_id is not None:
-                sql += " AND user_id = :user_id"
                 params["user_id"] = user_id
 
-            if not include_system:
-                sql += " AND role = 'user'"
-
-            sql += " ORDER BY timestamp DESC LIMIT :limit"
-
-            result = conn.execute(text(sql), params)
+            result = conn.execute(_HISTORY_SQL[(user_id is not None, include_system)], params)
             rows = result.mappings().fetchall()
             
             messages = []
             for row in reversed(rows):  # 시간순으로 정렬
-                metadata = json.loads(row['metadata']) if row['metadata'] else None
+                metadata = orjson.loads(row['metadata']) if row['metadata'] else None
                 message = Message(
                     message_id=row['id'],
                     chat_id=row['chat_id'],
@@ -322,10 +432,60 @@ class MessageStorage:
                 messages.append(message)
             
             return messages
+
+    def get_context_rows(self, chat_id: int, limit: int = 20) -> List[Tuple[str, str]]:
+        """
+        대화 컨텍스트용 (role, content) 목록 조회
+
+        get_conversation_history와 같은 메시지를 반환하지만 두 컬럼만 읽고
+        Message 객체 생성과 metadata JSON 파싱을 생략합니다.
+
+        Args:
+            chat_id: 채팅 ID
+            limit: 최대 메시지 수
+
+        Returns:
+            (role, content) 목록 (시간순 정렬)
+        """
+        with self._get_connection() as conn:
+            rows = conn.execute(_CONTEXT_ROWS_SQL, {"chat_id": chat_id, "limit": limit}).fetchall()
+        return [(role, content) for role, content in reversed(rows)]
+
+    def get_recent_messages(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        모든 채팅의 최근 메시지를 최신순으로 조회 (모니터링 페이지용)
+
+        Args:
+            limit: 최대 메시지 수
+
+        Returns:
+            messages 테이블 행(dict) 목록
+        """
+        with self._get_connection() as conn:
+            rows = conn.execute(_RECENT_MESSAGES_SQL, {"limit": limit}).mappings().fetchall()
+        return [dict(row) for row in rows]
     
+    def count_messages(self, chat_id: int, user_id: Optional[int] = None) -> int:
+        """
+        대화 메시지 수 조회 (인덱스만으로 COUNT)
+
+        Args:
+            chat_id: 채팅 ID
+            user_id: 특정 사용자만 집계 (None이면 모든 사용자)
+
+        Returns:
+            메시지 수
+        """
+        with self._get_connection() as conn:
+            sql = "SELECT COUNT(*) FROM messages WHERE chat_id = :chat_id"
+            params = {"chat_id": chat_id}
+            if user_id is not None:
+                sql += " AND user_id = :user_id"
+                params["user_id"] = user_id
+            return conn.execute(text(sql), params).scalar() or 0
+
     def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """사용자 통계 조회"""
-        from sqlalchemy import text
         with self._get_connection() as conn:
             # 총 메시지 수
             result = conn.execute(text("""
@@ -369,7 +529,6 @@ class MessageStorage:
     
     def get_user_chat_list(self, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
         """특정 사용자가 참여한 채팅방 목록 및 요약 정보 반환"""
-        from sqlalchemy import text
         with self._get_connection() as conn:
             result = conn.execute(text("""
                 SELECT 
@@ -408,30 +567,90 @@ class MessageStorage:
                 })
             return chat_list
 
-    def save_token_usage(self, user_id: int, chat_id: int, tokens: int, role: str = 'user', message_id: Optional[int] = None, timestamp: Optional[datetime] = None, interaction_id: Optional[str] = None) -> int:
+    def save_token_usage(self, user_id: int, chat_id: int, tokens: int, role: str = 'user', message_id: Optional[int] = None, timestamp: Optional[datetime] = None, interaction_id: Optional[str] = None, conn=None) -> int:
         """
         토큰 사용량 기록 저장
 
+        conn을 넘기면 transaction()으로 연 트랜잭션 안에서 저장합니다.
+
         Returns: token_usage id
         """
+        if conn is None:
+            with self.transaction() as conn:
+                return self.save_token_usage(user_id, chat_id, tokens, role, message_id, timestamp, interaction_id, conn)
+
+        ts = timestamp or datetime.now()
+        cursor = conn.execute(_INSERT_TOKEN_USAGE_SQL, {"user_id": user_id, "chat_id": chat_id, "message_id": message_id, "interaction_id": interaction_id, "role": role, "tokens": tokens, "ts": ts})
+        try:
+            lastrowid = cursor.lastrowid or 0
+        except Exception:
+            lastrowid = (cursor.inserted_primary_key[0] if hasattr(cursor, 'inserted_primary_key') and cursor.inserted_primary_key else 0)
+        return int(lastrowid)
+
+    def save_token_usage_batch(self, user_id: int, chat_id: int, rows: List[Tuple[str, int, Optional[int]]], interaction_id: Optional[str] = None, timestamp: Optional[datetime] = None, conn=None) -> None:
+        """
+        한 턴의 토큰 사용량을 한 번에 저장 (executemany)
+
+        conn을 넘기면 transaction()으로 연 트랜잭션 안에서 저장합니다.
+
+        Args:
+            user_id: 사용자 ID
+            chat_id: 채팅 ID
+            rows: (role, tokens, message_id) 목록
+            interaction_id: 턴 ID
+            timestamp: 기록 시각 (없으면 현재 시각)
+        """
+        if not rows:
+            return
+        if conn is None:
+            with self.transaction() as conn:
+                return self.save_token_usage_batch(user_id, chat_id, rows, interaction_id, timestamp, conn)
+
+        ts = timestamp or datetime.now()
+        conn.execute(_INSERT_TOKEN_USAGE_SQL, [
+            {"user_id": user_id, "chat_id": chat_id, "message_id": message_id, "interaction_id": interaction_id, "role": role, "tokens": tokens, "ts": ts}
+            for role, tokens, message_id in rows
+        ])
+
+    def get_cached_response(self, cache_key: str, max_age: float) -> Optional[str]:
+        """
+        캐시된 응답 조회
+
+        Args:
+            cache_key: 응답 캐시 키
+            max_age: 유효 기간(초)
+
+        Returns:
+            캐시된 응답 (없거나 만료되었으면 None)
+        """
+        with self._get_connection() as conn:
+            row = conn.execute(text("""
+                SELECT response FROM response_cache
+                WHERE cache_key = :cache_key AND created_at >= :cutoff
+            """), {"cache_key": cache_key, "cutoff": time.time() - max_age}).fetchone()
+            return row[0] if row else None
+
+    def save_cached_response(self, cache_key: str, response: str, max_age: float) -> None:
+        """
+        응답 캐시 저장 (만료된 항목은 함께 정리)
+
+        Args:
+            cache_key: 응답 캐시 키
+            response: 저장할 응답
+            max_age: 유효 기간(초)
+        """
+        now = time.time()
         with self._lock:
-            from sqlalchemy import text
             with self._get_connection() as conn:
-                ts = timestamp or datetime.now()
                 with conn.begin():
-                    cursor = conn.execute(text("""
-                        INSERT INTO token_usage (user_id, chat_id, message_id, interaction_id, role, tokens, timestamp)
-                        VALUES (:user_id, :chat_id, :message_id, :interaction_id, :role, :tokens, :ts)
-                    """), {"user_id": user_id, "chat_id": chat_id, "message_id": message_id, "interaction_id": interaction_id, "role": role, "tokens": tokens, "ts": ts})
-                    try:
-                        lastrowid = cursor.lastrowid or 0
-                    except Exception:
-                        lastrowid = (cursor.inserted_primary_key[0] if hasattr(cursor, 'inserted_primary_key') and cursor.inserted_primary_key else 0)
-                return int(lastrowid)
+                    conn.execute(text("DELETE FROM response_cache WHERE created_at < :cutoff"), {"cutoff": now - max_age})
+                    conn.execute(text("""
+                        INSERT OR REPLACE INTO response_cache (cache_key, response, created_at)
+                        VALUES (:cache_key, :response, :created_at)
+                    """), {"cache_key": cache_key, "response": response, "created_at": now})
 
     def get_user_token_stats(self, user_id: int) -> Dict[str, Any]:
         """사용자별 토큰 통계 반환"""
-        from sqlalchemy import text
         with self._get_connection() as conn:
             result = conn.execute(text("""
                 SELECT SUM(tokens) as total_tokens,
@@ -463,7 +682,6 @@ class MessageStorage:
     
     def get_chat_stats(self, chat_id: int) -> Dict[str, Any]:
         """채팅방 통계 조회"""
-        from sqlalchemy import text
         with self._get_connection() as conn:
             # 기본 통계
             result = conn.execute(text("""
@@ -510,27 +728,36 @@ class MessageStorage:
         Returns:
             검색 결과 메시지 목록
         """
-        from sqlalchemy import text
         with self._get_connection() as conn:
-            sql = "SELECT m.*, t.tokens FROM messages m LEFT JOIN token_usage t ON m.id = t.message_id WHERE m.content LIKE :q"
-            params = {"q": f"%{query}%", "limit": limit}
+            # trigram 인덱스는 3글자 이상만 검색 가능; LIKE 와일드카드를 쓰는 호출은 기존 방식 유지
+            if self._fts_enabled and len(query) >= 3 and "%" not in query and "_" not in query:
+                sql = (
+                    "SELECT m.*, t.tokens FROM messages_fts f"
+                    " JOIN messages m ON m.id = f.rowid"
+                    " LEFT JOIN token_usage t ON m.id = t.message_id"
+                    " WHERE messages_fts MATCH :q"
+                )
+                params = {"q": '"' + query.replace('"', '""') + '"', "limit": limit}
+            else:
+                sql = "SELECT m.*, t.tokens FROM messages m LEFT JOIN token_usage t ON m.id = t.message_id WHERE m.content LIKE :q"
+                params = {"q": f"%{query}%", "limit": limit}
 
             if chat_id is not None:
-                sql += " AND chat_id = :chat_id"
+                sql += " AND m.chat_id = :chat_id"
                 params["chat_id"] = chat_id
 
             if user_id is not None:
-                sql += " AND user_id = :user_id"
+                sql += " AND m.user_id = :user_id"
                 params["user_id"] = user_id
 
-            sql += " ORDER BY timestamp DESC LIMIT :limit"
+            sql += " ORDER BY m.timestamp DESC LIMIT :limit"
 
             result = conn.execute(text(sql), params)
             rows = result.mappings().fetchall()
             
             messages = []
             for row in rows:
-                metadata = json.loads(row['metadata']) if row['metadata'] else None
+                metadata = orjson.loads(row['metadata']) if row['metadata'] else None
                 message = Message(
                     message_id=row['id'],
                     chat_id=row['chat_id'],
@@ -545,35 +772,58 @@ class MessageStorage:
             
             return messages
     
-    def cleanup_old_messages(self, days_to_keep: int = 30) -> int:
+    def cleanup_old_messages(self, days_to_keep: int = 30, batch_size: int = 10000) -> int:
         """
         오래된 메시지 정리
         
         Args:
             days_to_keep: 보관할 일수
+            batch_size: 트랜잭션당 삭제할 최대 메시지 수 (WAL 크기와 잠금 시간 제한)
             
         Returns:
             삭제된 메시지 수
         """
-        cutoff_date = datetime.now() - timedelta(days=days_to_keep)
-        
-        from sqlalchemy import text
-        with self._lock:
-            with self._get_connection() as conn:
-                with conn.begin():
-                    cursor = conn.execute(text("DELETE FROM messages WHERE timestamp < :cutoff"), {"cutoff": cutoff_date})
-                deleted_count = cursor.rowcount
+        return self.prune_old_messages(days_to_keep, batch_size)[0]
 
-                # VACUUM으로 디스크 공간 회수
-                # Use driver-level execution for VACUUM which is DDL-like
-                conn.exec_driver_sql("VACUUM")
+    def prune_old_messages(self, days_to_keep: int = 30, batch_size: int = 10000) -> Tuple[int, Set[int]]:
+        """
+        cleanup_old_messages와 같지만 메시지가 삭제된 채팅 ID도 함께 반환
+        (호출 측에서 해당 채팅의 대화 캐시를 무효화할 수 있도록)
 
-                logger.info(f"Cleaned up {deleted_count} old messages")
-                return deleted_count
+        Returns:
+            (삭제된 메시지 수, 메시지가 삭제된 chat_id 집합)
+        """
+        cutoff_date = datetime.now() - timedelta(days=days_to_keep)
+        params = {"cutoff": cutoff_date, "batch_size": batch_size}
+        # 오래된 메시지는 id가 작으므로 id 순으로 찾으면 앞부분에서 바로 멈춤
+        batch_ids = "SELECT id FROM messages WHERE timestamp < :cutoff ORDER BY id LIMIT :batch_size"
+        
+        deleted_count = 0
+        chat_ids: Set[int] = set()
+        with self._get_connection() as conn:
+            while True:
+                # 배치마다 잠금을 풀어 정리 중에도 다른 쓰기가 진행되도록 함
+                with self._lock:
+                    with conn.begin():
+                        chat_ids.update(row[0] for row in conn.execute(
+                            text(f"SELECT DISTINCT chat_id FROM messages WHERE id IN ({batch_ids})"), params
+                        ))
+                        # 외래 키 제약을 위해 token_usage를 먼저 삭제
+                        conn.execute(text(f"DELETE FROM token_usage WHERE message_id IN ({batch_ids})"), params)
+                        cursor = conn.execute(text(f"DELETE FROM messages WHERE id IN ({batch_ids})"), params)
+                deleted_count += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    break
+
+            if deleted_count:
+                # VACUUM(전체 DB 재작성) 대신 WAL 파일만 비움; 해제된 페이지는 이후 INSERT에서 재사용
+                conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        logger.info(f"Cleaned up {deleted_count} old messages")
+        return deleted_count, chat_ids
     
     def get_database_stats(self) -> Dict[str, Any]:
         """데이터베이스 전체 통계"""
-        from sqlalchemy import text
         with self._get_connection() as conn:
             stats = {}
 
@@ -617,11 +867,11 @@ class MessageStorage:
         데이터베이스의 모든 테이블을 삭제하고 재생성합니다.
         주의: 모든 데이터가 삭제됩니다.
         """
-        from sqlalchemy import text
         with self._lock:
             with self._get_connection() as conn:
                 logger.warning("Resetting database. All data will be lost.")
-                tables = ['users', 'chats', 'messages', 'token_usage']
+                # 외래 키(foreign_keys=ON) 때문에 참조하는 테이블부터 삭제
+                tables = ['messages_fts', 'token_usage', 'response_cache', 'messages', 'chats', 'users']
                 with conn.begin():
                     for table in tables:
                         conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
@@ -651,7 +901,7 @@ class MessageStorage:
                     'content': msg.content,
                     'metadata': msg.metadata
                 })
-            return json.dumps(data, indent=2, ensure_ascii=False)
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
         
         elif format == 'txt':
             lines = []
@@ -38,12 +38,4 @@ class MessageRepository:
         )
 
     def list_recent(self, limit: int = 50):
-        with self.storage._get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT * FROM messages ORDER BY timestamp DESC LIMIT ?", (limit,)
-            )
-            rows = cursor.fetchall()
-            results = []
-            for row in rows:
-                results.append(dict(row))
-            return results
+        return self.storage.get_recent_messages(limit=limit)
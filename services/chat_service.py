@@ -1,5 +1,8 @@
 import logging
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
 
 from repositories import ChatRepository
 from models import ChatInfo
@@ -7,8 +10,28 @@ from models import ChatInfo
 logger = logging.getLogger(__name__)
 
 class ChatService:
-    def __init__(self, repo: ChatRepository):
+    def __init__(self, repo: ChatRepository, persona_cache_size: int = 10000, persona_cache_ttl: float = 300.0):
+        """
+        Args:
+            repo: ChatRepository
+            persona_cache_size: Number of chats whose persona is cached (least recently used are evicted)
+            persona_cache_ttl: Seconds a cached persona is trusted; bounds how long a persona
+                changed by another replica stays stale here
+        """
         self.repo = repo
+        self.persona_cache_size = persona_cache_size
+        self.persona_cache_ttl = persona_cache_ttl
+        # chat_id -> (expires_at, persona), least recently used first; kept in sync by
+        # upsert_chat/set_persona. get_persona runs in worker threads, hence the lock
+        self._persona_cache: "OrderedDict[int, Tuple[float, Optional[str]]]" = OrderedDict()
+        self._persona_lock = threading.Lock()
+
+    def _cache_persona(self, chat_id: int, persona: Optional[str]) -> None:
+        with self._persona_lock:
+            self._persona_cache[chat_id] = (time.monotonic() + self.persona_cache_ttl, persona)
+            self._persona_cache.move_to_end(chat_id)
+            while len(self._persona_cache) > self.persona_cache_size:
+                self._persona_cache.popitem(last=False)
 
     def upsert_chat(
         self,
@@ -17,8 +40,11 @@ class ChatService:
         title: Optional[str] = None,
         username: Optional[str] = None,
         persona_prompt: Optional[str] = None,  # 페르소나 프롬프트 추가
-    ):
-        """채팅 정보를 추가하거나 업데이트합니다. 페르소나 정보를 덮어쓰지 않도록 주의합니다."""
+    ) -> Optional[str]:
+        """채팅 정보를 추가하거나 업데이트합니다. 페르소나 정보를 덮어쓰지 않도록 주의합니다.
+
+        Returns: 저장된 페르소나 (다시 조회할 필요 없음)
+        """
         logger.debug(f"[UPSERT_CHAT] Upserting chat_id {chat_id} with persona: '{persona_prompt}'")
         # 새 페르소나가 제공되지 않은 경우, 기존 페르소나를 유지합니다.
         if persona_prompt is None:
@@ -35,15 +61,34 @@ class ChatService:
             persona_prompt=existing_persona,
         )
         self.repo.upsert(chat)
+        self._cache_persona(chat_id, existing_persona)
+        return existing_persona
 
     def get_stats(self, chat_id: int):
         return self.repo.get_stats(chat_id)
 
     def set_persona(self, chat_id: int, persona_prompt: str):
         self.repo.update_persona(chat_id, persona_prompt)
+        self._cache_persona(chat_id, persona_prompt)
 
     def get_persona(self, chat_id: int) -> Optional[str]:
+        with self._persona_lock:
+            cached = self._persona_cache.get(chat_id)
+            if cached is not None and cached[0] > time.monotonic():
+                self._persona_cache.move_to_end(chat_id)
+                return cached[1]
         logger.debug(f"[GET_PERSONA_SVC] Getting persona for chat_id {chat_id}")
         persona = self.repo.get_persona(chat_id)
         logger.debug(f"[GET_PERSONA_SVC] Got persona for chat_id {chat_id}: '{persona}'")
+        self._cache_persona(chat_id, persona)
         return persona
+
+    def invalidate_persona(self, chat_id: int) -> None:
+        """Drop the cached persona so the next get_persona reads the database."""
+        with self._persona_lock:
+            self._persona_cache.pop(chat_id, None)
+
+    def clear_persona_cache(self) -> None:
+        """Drop every cached persona (e.g. after the chats table is reset)."""
+        with self._persona_lock:
+            self._persona_cache.clear()
@@ -0,0 +1,18 @@
+import pytest
+
+import message_storage
+from internal.database import create_backend
+from message_storage import MessageStorage
+from models import ChatInfo, UserInfo
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """MessageStorage bound to a fresh SQLite file (user 2 and chat 1 pre-registered)."""
+    backend = create_backend({"backend": "sqlite", "path": str(tmp_path / "test.db")})
+    monkeypatch.setattr(message_storage, "_engine", backend["engine"])
+    store = MessageStorage()
+    store.save_user(UserInfo(user_id=2, username="u"))
+    store.save_chat(ChatInfo(chat_id=1, chat_type="private"))
+    yield store
+    backend["engine"].dispose()
@@ -0,0 +1,95 @@
+from services.chat_service import ChatService
+
+
+class FakeChatRepository:
+    def __init__(self, personas=None):
+        self.personas = dict(personas or {})
+        self.persona_reads = 0
+
+    def upsert(self, chat):
+        if chat.persona_prompt is not None:
+            self.personas[chat.chat_id] = chat.persona_prompt
+
+    def update_persona(self, chat_id, persona_prompt):
+        self.personas[chat_id] = persona_prompt
+
+    def get_persona(self, chat_id):
+        self.persona_reads += 1
+        return self.personas.get(chat_id)
+
+
+def test_get_persona_reads_repository_once():
+    repo = FakeChatRepository({1: "pirate"})
+    svc = ChatService(repo)
+    assert svc.get_persona(1) == "pirate"
+    assert svc.get_persona(1) == "pirate"
+    assert repo.persona_reads == 1
+
+
+def test_missing_persona_is_cached():
+    repo = FakeChatRepository()
+    svc = ChatService(repo)
+    assert svc.get_persona(1) is None
+    assert svc.get_persona(1) is None
+    assert repo.persona_reads == 1
+
+
+def test_set_persona_updates_cache():
+    repo = FakeChatRepository({1: "pirate"})
+    svc = ChatService(repo)
+    svc.get_persona(1)
+    svc.set_persona(1, "poet")
+    assert svc.get_persona(1) == "poet"
+    assert repo.persona_reads == 1
+
+
+def test_upsert_chat_keeps_cached_persona():
+    repo = FakeChatRepository({1: "pirate"})
+    svc = ChatService(repo)
+    assert svc.upsert_chat(1, "private") == "pirate"
+    assert svc.get_persona(1) == "pirate"
+    assert svc.upsert_chat(1, "private", persona_prompt="poet") == "poet"
+    assert svc.get_persona(1) == "poet"
+    assert repo.persona_reads == 1
+
+
+def test_invalidate_persona_forces_reload():
+    repo = FakeChatRepository({1: "pirate"})
+    svc = ChatService(repo)
+    svc.get_persona(1)
+    repo.personas[1] = "poet"
+    svc.invalidate_persona(1)
+    assert svc.get_persona(1) == "poet"
+
+
+def test_persona_cache_evicts_least_recently_used():
+    repo = FakeChatRepository({1: "pirate", 2: "poet", 3: "chef"})
+    svc = ChatService(repo, persona_cache_size=2)
+    svc.get_persona(1)
+    svc.get_persona(2)
+    svc.get_persona(1)
+    svc.get_persona(3)
+    assert repo.persona_reads == 3
+    svc.get_persona(1)
+    assert repo.persona_reads == 3
+    svc.get_persona(2)
+    assert repo.persona_reads == 4
+
+
+def test_expired_persona_is_reloaded():
+    repo = FakeChatRepository({1: "pirate"})
+    svc = ChatService(repo, persona_cache_ttl=0)
+    svc.get_persona(1)
+    repo.personas[1] = "poet"
+    assert svc.get_persona(1) == "poet"
+
+
+def test_clear_persona_cache_forces_reload():
+    repo = FakeChatRepository({1: "pirate", 2: "poet"})
+    svc = ChatService(repo)
+    svc.get_persona(1)
+    svc.get_persona(2)
+    svc.clear_persona_cache()
+    repo.personas[1] = "chef"
+    assert svc.get_persona(1) == "chef"
+    assert repo.persona_reads == 3
@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+
+from handlers.command_handler_service import CommandHandlerService
+
+
+class FakeIncomingMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text):
+        self.replies.append(text)
+
+
+class FakeGeminiClient:
+    def __init__(self, cleared=3, error=None):
+        self.cleared = cleared
+        self.error = error
+        self.calls = []
+
+    async def clear_conversation(self, chat_id, user_id):
+        self.calls.append((chat_id, user_id))
+        if self.error:
+            raise self.error
+        return self.cleared
+
+
+def _update():
+    return SimpleNamespace(
+        message=FakeIncomingMessage(),
+        effective_chat=SimpleNamespace(id=10),
+        effective_user=SimpleNamespace(id=20),
+    )
+
+
+def test_clear_delegates_to_gemini_client():
+    client = FakeGeminiClient(cleared=3)
+    update = _update()
+    asyncio.run(CommandHandlerService(gemini_client=client).clear(update, None))
+    assert client.calls == [(10, 20)]
+    assert "3개" in update.message.replies[0]
+
+
+def test_clear_reports_storage_errors():
+    client = FakeGeminiClient(error=RuntimeError("db locked"))
+    update = _update()
+    asyncio.run(CommandHandlerService(gemini_client=client).clear(update, None))
+    assert update.message.replies == ["❌ 대화 기록 초기화 중 오류가 발생했습니다."]
+
+
+class FailingChatService:
+    def get_persona(self, chat_id):
+        raise RuntimeError("db locked")
+
+
+def test_get_persona_reports_storage_errors():
+    update = _update()
+    asyncio.run(CommandHandlerService(chat_service=FailingChatService()).get_persona(update, None))
+    assert update.message.replies == ["❌ 페르소나 조회 중 오류가 발생했습니다."]
@@ -0,0 +1,48 @@
+import json
+import os
+
+import pytest
+
+from config_loader import load_config
+
+BASE_CONFIG = {
+    "telegram": {"bot_token": "123:abc"},
+    "gemini": {"api_key": "key", "model_name": "gemini-pro"},
+    "app": {"debug": False},
+}
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    for var in ("GEMINI_MODEL", "TELEGRAM_BOT_TOKEN", "GEMINI_API_KEY"):
+        monkeypatch.delenv(var, raising=False)
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(BASE_CONFIG), encoding="utf-8")
+    return path
+
+
+def test_load_config_returns_independent_copies(config_file):
+    first = load_config(str(config_file))
+    first["gemini"]["model_name"] = "changed"
+    second = load_config(str(config_file))
+    assert second["gemini"]["model_name"] == "gemini-pro"
+
+
+def test_load_config_applies_env_overrides_on_each_call(config_file, monkeypatch):
+    load_config(str(config_file))
+    monkeypatch.setenv("GEMINI_MODEL", "gemini-1.5-flash")
+    assert load_config(str(config_file))["gemini"]["model_name"] == "gemini-1.5-flash"
+
+
+def test_load_config_rereads_modified_file(config_file):
+    load_config(str(config_file))
+    updated = dict(BASE_CONFIG, gemini={"api_key": "key", "model_name": "gemini-1.5-pro"})
+    config_file.write_text(json.dumps(updated), encoding="utf-8")
+    stat = os.stat(config_file)
+    os.utime(config_file, (stat.st_atime, stat.st_mtime + 10))
+    assert load_config(str(config_file))["gemini"]["model_name"] == "gemini-1.5-pro"
+
+
+def test_load_config_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_config(str(tmp_path / "missing.json"))
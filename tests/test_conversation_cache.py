@@ -0,0 +1,87 @@
+import asyncio
+
+from internal.conversation_cache import ConversationCache
+
+
+def test_get_misses_until_seeded():
+    cache = ConversationCache(max_messages=4)
+    assert asyncio.run(cache.get(1, 2)) is None
+
+    asyncio.run(cache.seed(1, [("user", "a"), ("assistant", "b"), ("user", "c")]))
+    assert asyncio.run(cache.get(1, 2)) == [("assistant", "b"), ("user", "c")]
+
+
+def test_append_trims_to_max_messages():
+    cache = ConversationCache(max_messages=3)
+    asyncio.run(cache.seed(1, [("user", "a"), ("assistant", "b")]))
+    asyncio.run(cache.append(1, [("user", "c"), ("assistant", "d")]))
+    assert asyncio.run(cache.get(1, 3)) == [("assistant", "b"), ("user", "c"), ("assistant", "d")]
+
+
+def test_append_ignores_uncached_chat():
+    cache = ConversationCache(max_messages=4)
+    asyncio.run(cache.append(1, [("user", "a")]))
+    assert asyncio.run(cache.get(1, 4)) is None
+
+
+def test_limit_above_max_messages_is_a_miss():
+    cache = ConversationCache(max_messages=2)
+    asyncio.run(cache.seed(1, [("user", "a")]))
+    assert asyncio.run(cache.get(1, 3)) is None
+
+
+def test_clear_drops_history():
+    cache = ConversationCache(max_messages=4)
+    asyncio.run(cache.seed(1, [("user", "a")]))
+    asyncio.run(cache.clear(1))
+    assert asyncio.run(cache.get(1, 4)) is None
+
+
+def test_least_recently_used_chat_is_evicted():
+    cache = ConversationCache(max_messages=4, max_chats=2)
+    asyncio.run(cache.seed(1, [("user", "a")]))
+    asyncio.run(cache.seed(2, [("user", "b")]))
+    asyncio.run(cache.get(1, 1))
+    asyncio.run(cache.seed(3, [("user", "c")]))
+    assert asyncio.run(cache.get(2, 1)) is None
+    assert asyncio.run(cache.get(1, 1)) == [("user", "a")]
+    assert asyncio.run(cache.get(3, 1)) == [("user", "c")]
+
+
+class UnusedRedis:
+    async def lrange(self, *args):
+        raise AssertionError("LRANGE key -0 -1 would return the whole list")
+
+
+def test_zero_limit_returns_no_history():
+    cache = ConversationCache(max_messages=4)
+    asyncio.run(cache.seed(1, [("user", "a")]))
+    assert asyncio.run(cache.get(1, 0)) == []
+    assert asyncio.run(ConversationCache(redis_client=UnusedRedis()).get(1, 0)) == []
+
+
+class KeysRedis:
+    def __init__(self, keys):
+        self.keys = set(keys)
+
+    async def scan_iter(self, match, count=None):
+        prefix = match.rstrip("*")
+        for key in sorted(self.keys):
+            if key.startswith(prefix):
+                yield key
+
+    async def delete(self, *keys):
+        self.keys.difference_update(keys)
+
+
+def test_clear_all_drops_every_chat():
+    cache = ConversationCache(max_messages=4)
+    asyncio.run(cache.seed(1, [("user", "a")]))
+    asyncio.run(cache.seed(2, [("user", "b")]))
+    asyncio.run(cache.clear_all())
+    assert asyncio.run(cache.get(1, 4)) is None
+    assert asyncio.run(cache.get(2, 4)) is None
+
+    redis = KeysRedis(["conv:1", "conv:2", "gemcache:x"])
+    asyncio.run(ConversationCache(redis_client=redis).clear_all())
+    assert redis.keys == {"gemcache:x"}
@@ -0,0 +1,291 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+import message_storage
+from gemini_client import GeminiClient
+from models import ChatInfo, Message, UserInfo
+
+CHAT_ID = 1
+USER_ID = 2
+
+
+class FakeChunk:
+    def __init__(self, text, finish_reason=None):
+        self.text = text
+        self.candidates = [SimpleNamespace(finish_reason=SimpleNamespace(name=finish_reason))] if finish_reason else []
+        self.usage_metadata = (
+            SimpleNamespace(prompt_token_count=5, candidates_token_count=3) if finish_reason else None
+        )
+
+
+class FakeStream:
+    def __init__(self, parts, finish_reason):
+        self.parts = parts
+        self.finish_reason = finish_reason
+
+    async def __aiter__(self):
+        for i, part in enumerate(self.parts):
+            yield FakeChunk(part, self.finish_reason if i == len(self.parts) - 1 else None)
+
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel; counts the requests it receives."""
+
+    def __init__(self, parts=("Hel", "lo"), finish_reason="STOP"):
+        self.parts = parts
+        self.finish_reason = finish_reason
+        self.requests = []
+        # History passed to each start_chat call (requests without history skip it)
+        self.histories = []
+
+    async def generate_content_async(self, message, **kwargs):
+        self.requests.append(message)
+        return FakeStream(self.parts, self.finish_reason)
+
+    def start_chat(self, history=None):
+        self.histories.append(history)
+        return SimpleNamespace(send_message_async=self.generate_content_async)
+
+
+@pytest.fixture
+def make_client(storage, monkeypatch):
+    """Build GeminiClients on the temporary storage without calling the Gemini API."""
+    monkeypatch.setattr(GeminiClient, "_validate_model", lambda self: None)
+
+    def make(model=None, **config):
+        model = model or FakeModel()
+        monkeypatch.setattr(GeminiClient, "_initialize_model", lambda self: model)
+        return GeminiClient(dict({"api_key": "test"}, **config), storage)
+
+    return make
+
+
+def _trim(history, budget):
+    """Call _trim_history_to_budget without building a client."""
+    fake = SimpleNamespace(context_token_budget=budget, _estimate_tokens=GeminiClient._estimate_tokens)
+    return GeminiClient._trim_history_to_budget(fake, history)
+
+
+def _turns(n):
+    """n user/assistant pairs; each message is estimated at 10 tokens."""
+    history = []
+    for i in range(n):
+        history.append(("user", f"q{i}".ljust(39, ".")))
+        history.append(("assistant", f"a{i}".ljust(39, ".")))
+    return history
+
+
+async def _reply(client, message, maintain_context=False):
+    chunks = [
+        chunk async for chunk in client.generate_response(
+            CHAT_ID, USER_ID, message, maintain_context=maintain_context
+        )
+    ]
+    return "".join(c for c in chunks if isinstance(c, str))
+
+
+def test_storage_cache_hit_and_miss(storage):
+    storage.save_cached_response("k1", "answer", max_age=60)
+    assert storage.get_cached_response("k1", max_age=60) == "answer"
+    assert storage.get_cached_response("k2", max_age=60) is None
+
+
+def test_storage_cache_entries_expire(storage, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(message_storage.time, "time", lambda: now)
+    storage.save_cached_response("k1", "answer", max_age=60)
+
+    now += 59
+    assert storage.get_cached_response("k1", max_age=60) == "answer"
+    now += 2
+    assert storage.get_cached_response("k1", max_age=60) is None
+
+
+def test_cache_key_is_stable_for_identical_turns(make_client):
+    client = make_client()
+    history = [("user", "hi"), ("assistant", "hello")]
+    assert client._response_cache_key("persona", history, "msg") == client._response_cache_key(
+        "persona", list(history), "msg"
+    )
+
+
+def test_cache_key_changes_with_every_input(make_client):
+    client = make_client()
+    history = [("user", "hi"), ("assistant", "hello")]
+    base = client._response_cache_key("persona", history, "msg")
+    variants = [
+        client._response_cache_key("other persona", history, "msg"),
+        client._response_cache_key(None, history, "msg"),
+        client._response_cache_key("persona", history[:1], "msg"),
+        client._response_cache_key("persona", [("user", "hi"), ("assistant", "hey")], "msg"),
+        client._response_cache_key("persona", history, "other msg"),
+    ]
+    client.set_model_parameters(temperature=0.1)
+    variants.append(client._response_cache_key("persona", history, "msg"))
+    assert base not in variants
+    assert len(set(variants)) == len(variants)
+
+
+def test_identical_turn_is_served_from_cache(make_client):
+    model = FakeModel()
+    client = make_client(model, response_cache_ttl=60, temperature=0.0)
+
+    assert asyncio.run(_reply(client, "question")) == "Hello"
+    assert asyncio.run(_reply(client, "question")) == "Hello"
+    assert model.requests == ["question"]
+
+    asyncio.run(_reply(client, "another question"))
+    assert model.requests == ["question", "another question"]
+
+
+def test_only_complete_replies_are_cached(make_client):
+    model = FakeModel(finish_reason="MAX_TOKENS")
+    client = make_client(model, response_cache_ttl=60, temperature=0.0)
+
+    asyncio.run(_reply(client, "question"))
+    asyncio.run(_reply(client, "question"))
+    assert len(model.requests) == 2
+
+    model.finish_reason = "STOP"
+    asyncio.run(_reply(client, "question"))
+    asyncio.run(_reply(client, "question"))
+    assert len(model.requests) == 3
+
+
+def test_trim_budget_zero_keeps_everything():
+    history = _turns(50)
+    assert _trim(history, 0) == history
+
+
+def test_trim_drops_oldest_messages_first():
+    history = _turns(5)
+    assert GeminiClient._estimate_tokens(history[0][1]) == 10
+    # 40 tokens fit the last four messages (two full turns)
+    assert _trim(history, 40) == history[-4:]
+    assert _trim(history, 1000) == history
+
+
+def test_trim_result_starts_with_a_user_turn():
+    history = _turns(5)
+    # 30 tokens fit the last three messages, which would open with a reply
+    trimmed = _trim(history, 30)
+    assert trimmed == history[-2:]
+    assert trimmed[0][0] == "user"
+    # Even an older leading reply is skipped when the budget allows everything
+    assert _trim([("assistant", "intro")] + history, 1000) == history
+    # Nothing fits: no history rather than a lone reply
+    assert _trim(history, 5) == []
+
+
+def _turn_messages():
+    return [
+        Message(chat_id=CHAT_ID, user_id=USER_ID, role=role, content=content, timestamp=datetime.now())
+        for role, content in (("user", "question"), ("assistant", "answer"))
+    ]
+
+
+def _row_counts(storage):
+    with storage._get_connection() as conn:
+        return tuple(
+            conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() for table in ("messages", "token_usage")
+        )
+
+
+def test_save_turn_stores_messages_and_token_usage(make_client, storage):
+    client = make_client()
+    usage = SimpleNamespace(prompt_token_count=5, candidates_token_count=3)
+    client._save_turn(CHAT_ID, USER_ID, "turn-1", _turn_messages(), usage)
+    assert _row_counts(storage) == (2, 2)
+
+
+def test_save_turn_failure_rolls_back_messages_and_token_usage(make_client, storage, monkeypatch):
+    client = make_client()
+    save_batch = storage.save_token_usage_batch
+
+    def save_batch_then_fail(*args, **kwargs):
+        save_batch(*args, **kwargs)
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(storage, "save_token_usage_batch", save_batch_then_fail)
+    usage = SimpleNamespace(prompt_token_count=5, candidates_token_count=3)
+    with pytest.raises(RuntimeError):
+        client._save_turn(CHAT_ID, USER_ID, "turn-1", _turn_messages(), usage)
+
+    assert _row_counts(storage) == (0, 0)
+
+
+def _sent_contents(history):
+    return [entry["parts"][0] for entry in history]
+
+
+def test_reset_drops_cached_history(make_client, storage):
+    model = FakeModel()
+    client = make_client(model)
+    asyncio.run(_reply(client, "before reset", maintain_context=True))
+    asyncio.run(_reply(client, "second", maintain_context=True))
+    assert _sent_contents(model.histories[-1]) == ["before reset", "Hello"]
+
+    storage.reset_database()
+    asyncio.run(client.reset_caches())
+    storage.save_user(UserInfo(user_id=USER_ID, username="u"))
+    storage.save_chat(ChatInfo(chat_id=CHAT_ID, chat_type="private"))
+    asyncio.run(_reply(client, "after reset", maintain_context=True))
+
+    # No history left, so the request goes out without a chat session
+    assert len(model.histories) == 1
+    assert model.requests[-1] == "after reset"
+
+
+def test_cleanup_drops_pruned_messages_from_cached_history(make_client, storage):
+    old = datetime.now() - timedelta(days=60)
+    storage.save_messages([
+        Message(chat_id=CHAT_ID, user_id=USER_ID, role=role, content=content, timestamp=old + timedelta(seconds=i))
+        for i, (role, content) in enumerate((("user", "old question"), ("assistant", "old answer")))
+    ])
+    model = FakeModel()
+    client = make_client(model)
+    asyncio.run(_reply(client, "recent", maintain_context=True))
+    assert _sent_contents(model.histories[-1]) == ["old question", "old answer"]
+
+    assert asyncio.run(client.cleanup_old_data(days_to_keep=30))["deleted_messages"] == 2
+    asyncio.run(_reply(client, "next", maintain_context=True))
+    assert _sent_contents(model.histories[-1]) == ["recent", "Hello"]
+
+
+class KeysRedis:
+    """Just enough of redis.asyncio.Redis for flushing key prefixes."""
+
+    def __init__(self, keys):
+        self.keys = set(keys)
+
+    async def scan_iter(self, match, count=None):
+        prefix = match.rstrip("*")
+        for key in sorted(self.keys):
+            if key.startswith(prefix):
+                yield key
+
+    async def delete(self, *keys):
+        self.keys.difference_update(keys)
+
+
+def test_reset_flushes_redis_response_cache(make_client):
+    client = make_client()
+    client.redis = KeysRedis(["gemcache:a", "gemcache:b", "other:c"])
+    asyncio.run(client.reset_caches())
+    assert client.redis.keys == {"other:c"}
+
+
+class FailingModel(FakeModel):
+    async def generate_content_async(self, message, **kwargs):
+        self.requests.append(message)
+        raise RuntimeError("quota exceeded")
+
+
+def test_failed_turn_still_saves_the_user_message(make_client, storage):
+    client = make_client(FailingModel())
+    assert "quota exceeded" in asyncio.run(_reply(client, "lost question"))
+    assert [m.content for m in storage.get_conversation_history(CHAT_ID)] == ["lost question"]
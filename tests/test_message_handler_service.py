@@ -0,0 +1,130 @@
+import asyncio
+from types import SimpleNamespace
+
+from handlers.message_handler_service import _BUSY_REPLY, MessageHandlerService, _StreamingReply, _iter_chunks
+
+
+class FakeSentMessage:
+    def __init__(self, text):
+        self.edits = [text]
+
+    async def edit_text(self, text):
+        self.edits.append(text)
+
+
+class FakeIncomingMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text):
+        sent = FakeSentMessage(text)
+        self.replies.append(sent)
+        return sent
+
+
+async def _stream(reply, chunks):
+    for chunk in chunks:
+        await reply.add(chunk)
+        # Like a real stream, give pending edits a chance to run between chunks
+        await asyncio.sleep(0)
+    await reply.finish()
+
+
+def test_iter_chunks_short_text_is_single_piece():
+    assert list(_iter_chunks("hello", 10)) == ["hello"]
+
+
+def test_iter_chunks_splits_at_last_newline():
+    text = "line one\nline two\nline three"
+    assert list(_iter_chunks(text, 20)) == ["line one\nline two", "line three"]
+
+
+def test_iter_chunks_forces_split_without_newline():
+    assert list(_iter_chunks("abcdefghij", 4)) == ["abcd", "efgh", "ij"]
+
+
+def test_iter_chunks_pieces_respect_limit():
+    text = ("x" * 7 + "\n") * 50
+    pieces = list(_iter_chunks(text, 30))
+    assert all(len(p) <= 30 for p in pieces)
+    assert "".join(pieces).replace("\n", "") == text.replace("\n", "")
+
+
+def test_streaming_reply_edits_one_message_in_place():
+    incoming = FakeIncomingMessage()
+    asyncio.run(_stream(_StreamingReply(incoming, 100, edit_interval=0), ["Hel", "lo", " there"]))
+    assert len(incoming.replies) == 1
+    assert incoming.replies[0].edits == ["Hel", "Hello", "Hello there"]
+
+
+def test_streaming_reply_starts_new_message_past_limit():
+    incoming = FakeIncomingMessage()
+    asyncio.run(_stream(_StreamingReply(incoming, 10, edit_interval=0), ["abcdefgh\n", "ijklmnop"]))
+    assert [r.edits[-1] for r in incoming.replies] == ["abcdefgh", "ijklmnop"]
+
+
+def test_reply_without_streaming_sends_only_final_text():
+    incoming = FakeIncomingMessage()
+    asyncio.run(_stream(_StreamingReply(incoming, 100, edit_interval=None), ["Hel", "lo"]))
+    assert [r.edits for r in incoming.replies] == [["Hello"]]
+
+
+def test_reply_without_streaming_splits_many_small_chunks():
+    incoming = FakeIncomingMessage()
+    chunks = list("abcdefgh\nijklmnop")
+    asyncio.run(_stream(_StreamingReply(incoming, 10, edit_interval=None), chunks))
+    assert [r.edits for r in incoming.replies] == [["abcdefgh"], ["ijklmnop"]]
+
+
+def test_streaming_reply_spaces_out_split_messages():
+    incoming = FakeIncomingMessage()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await _stream(_StreamingReply(incoming, 10, edit_interval=None, send_interval=0.05), ["abcdefgh\nijklmnop"])
+        return loop.time() - start
+
+    assert asyncio.run(run()) >= 0.05
+    assert [r.edits for r in incoming.replies] == [["abcdefgh"], ["ijklmnop"]]
+
+
+def test_streaming_reply_merges_chunks_while_edit_in_flight():
+    incoming = FakeIncomingMessage()
+
+    async def run():
+        reply = _StreamingReply(incoming, 100, edit_interval=0)
+        # No await between chunks, so the first send is still pending
+        for chunk in ["Hel", "lo", " there"]:
+            await reply.add(chunk)
+        await reply.finish()
+
+    asyncio.run(run())
+    assert [r.edits for r in incoming.replies] == [["Hel", "Hello there"]]
+
+
+def _text_update(user_id, text):
+    message = FakeIncomingMessage()
+    message.text = text
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=message)
+
+
+def test_message_sent_mid_answer_is_turned_away():
+    service = MessageHandlerService(gemini_client=None)
+    answered = []
+
+    async def respond(update, context, message):
+        answered.append((update.effective_user.id, message))
+
+    service._respond = respond
+    busy, other = _text_update(1, "second"), _text_update(2, "hello")
+
+    async def scenario():
+        # User 1 still has a turn running
+        async with service._user_lock(1):
+            await service.handle(busy, None)
+            await service.handle(other, None)
+
+    asyncio.run(scenario())
+    assert [sent.edits[0] for sent in busy.message.replies] == [_BUSY_REPLY]
+    assert answered == [(2, "hello")]
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from models import ChatInfo, Message, UserInfo
+
+# Registered by the storage fixture in conftest.py
+CHAT_ID = 1
+USER_ID = 2
+
+
+def _save(storage, content, timestamp=None, role="user"):
+    return storage.save_message(Message(
+        chat_id=CHAT_ID, user_id=USER_ID, role=role, content=content,
+        timestamp=timestamp or datetime.now(),
+    ))
+
+
+def _contents(messages):
+    return [m.content for m in messages]
+
+
+def _fts_count(storage):
+    with storage._get_connection() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM messages_fts")).scalar()
+
+
+def _drop_from_index(storage, message_id, content):
+    """Remove a row from the FTS index only, leaving messages untouched."""
+    with storage.transaction() as conn:
+        conn.execute(
+            text("INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', :id, :content)"),
+            {"id": message_id, "content": content},
+        )
+
+
+def test_fts_matches_korean_substring(storage):
+    assert storage._fts_enabled
+    _save(storage, "오늘 날씨가 정말 좋네요")
+    _save(storage, "내일은 비가 온대요")
+
+    assert _contents(storage.search_messages("날씨가")) == ["오늘 날씨가 정말 좋네요"]
+    # 단어 경계와 무관한 부분 문자열도 LIKE와 같이 검색됨
+    assert _contents(storage.search_messages("씨가 정")) == ["오늘 날씨가 정말 좋네요"]
+
+
+def test_queries_of_three_chars_use_the_index(storage):
+    content = "trigram routed query"
+    message_id = _save(storage, content)
+    _drop_from_index(storage, message_id, content)
+
+    # 3글자 이상은 FTS 인덱스를 거치므로 인덱스에서 빠진 행은 찾지 못함
+    assert storage.search_messages("routed") == []
+    # 짧은 검색어는 LIKE로 messages 테이블을 직접 검색
+    assert _contents(storage.search_messages("ro")) == [content]
+
+
+def test_wildcards_and_short_queries_fall_back_to_like(storage):
+    content = "abc 테스트"
+    message_id = _save(storage, content)
+    _drop_from_index(storage, message_id, content)
+
+    assert _contents(storage.search_messages("a_c")) == [content]
+    assert _contents(storage.search_messages("%")) == [content]
+    assert _contents(storage.search_messages("테스")) == [content]
+
+
+def test_index_follows_deletes(storage):
+    _save(storage, "지워질 메시지입니다")
+    assert _fts_count(storage) == 1
+
+    storage.clear_conversation(CHAT_ID, USER_ID)
+
+    assert _fts_count(storage) == 0
+    assert storage.search_messages("메시지") == []
+
+
+def test_index_is_rebuilt_after_reset(storage):
+    _save(storage, "초기화 전 메시지")
+    storage.reset_database()
+    assert storage._fts_enabled
+    assert _fts_count(storage) == 0
+
+    storage.save_user(UserInfo(user_id=USER_ID, username="u"))
+    storage.save_chat(ChatInfo(chat_id=CHAT_ID, chat_type="private"))
+    _save(storage, "초기화 후 메시지")
+
+    assert _contents(storage.search_messages("메시지")) == ["초기화 후 메시지"]
+
+
+def test_cleanup_deletes_old_messages_in_batches(storage):
+    old = datetime.now() - timedelta(days=60)
+    old_ids = [_save(storage, f"old {i}", timestamp=old + timedelta(minutes=i)) for i in range(3)]
+    storage.save_token_usage(USER_ID, CHAT_ID, 10, message_id=old_ids[0], timestamp=old)
+    _save(storage, "recent one")
+    _save(storage, "recent two")
+
+    assert storage.cleanup_old_messages(days_to_keep=30, batch_size=1) == 3
+
+    remaining = storage.get_conversation_history(CHAT_ID, limit=10)
+    assert sorted(_contents(remaining)) == ["recent one", "recent two"]
+    assert storage.count_messages(CHAT_ID) == 2